@@ -0,0 +1,240 @@
+#!/usr/bin/python3
+#
+# This file converts the netlists of many boards at once
+#
+# The jobs are read from a manifest, either a CSV file with a header row
+# or a JSON file with a list of objects, using the following columns/keys:
+#
+#   name     Name of the job (optional, defaults to the output filename)
+#   netlist  Netlist of the board (Tango, KiCad, Telesis or EDIF, detected automatically)
+#   fpga     Designator of the FPGA
+#   output   Pin constraints file to generate
+#   mcu      Designator of the microcontroller (optional)
+#   ioc      STM32CubeMX project file of the microcontroller (optional)
+#   mcuxml   STM32CubeMX device description of the microcontroller (optional)
+#
+# Relative paths are interpreted relative to the manifest.
+# Jobs lacking netlist, fpga or output are reported as failed.
+#
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+import cache
+from cache import Cache
+from converter import Converter
+from formats import loadNetlist
+from instrumentation import instrumentation
+from cubemx_ioc import IOC
+from cubemx_xml import CubeXML
+from simple_csv import importCSV
+
+#
+# Columns of a job, which refer to files
+#
+fileColumns = ["netlist", "output", "ioc", "mcuxml"]
+
+#
+# All columns of a job and those, which must not be empty
+#
+columns = ["name", "netlist", "fpga", "output", "mcu", "ioc", "mcuxml"]
+requiredColumns = ["netlist", "fpga", "output"]
+
+
+#
+# Import the list of jobs from a CSV or JSON manifest
+# as a list of dicts
+#
+# Invalid jobs are kept, with the reason in "error",
+# so that they can be reported as failed.
+#
+def importManifest(filename):
+    if filename.lower().endswith(".json"):
+        f = open(filename, "r")
+        entries = json.load(f)
+        f.close()
+        if not isinstance(entries, list):
+            raise ValueError("Manifest {:s} does not contain a list of jobs.".format(filename))
+    else:
+        rows = [row for row in importCSV(filename) if len("".join(row).strip()) > 0]
+        if len(rows) < 1:
+            return []
+        header = [column.strip().lower() for column in rows[0]]
+        entries = []
+        for row in rows[1:]:
+            entries += [dict(zip(header, row))]
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    jobs = []
+    for entry in entries:
+        jobs += [validateJob(entry, len(jobs) + 1, directory)]
+    return jobs
+
+
+#
+# Turn a manifest entry into a job with all columns present
+# (None, if empty) and file paths made absolute
+#
+def validateJob(entry, number, directory):
+    job = {"error": None}
+    if not isinstance(entry, dict):
+        job["error"] = "Job is not an object"
+        entry = {}
+    for column in columns:
+        value = entry.get(column)
+        if not ((value is None) or isinstance(value, str)):
+            if job["error"] is None:
+                job["error"] = "Column {:s} is not a string".format(column)
+            value = None
+        if (value is None) or (value.strip() == ""):
+            job[column] = None
+        elif column in fileColumns:
+            job[column] = os.path.join(directory, value.strip())
+        else:
+            job[column] = value.strip()
+
+    for column in requiredColumns:
+        if (job[column] is None) and (job["error"] is None):
+            job["error"] = "Column {:s} is missing".format(column)
+    if job["name"] is None:
+        job["name"] = job["output"] or job["netlist"] or "Job {:d}".format(number)
+    return job
+
+
+#
+# Return the result of a job, which failed before conversion
+#
+def failedResult(job, message):
+    return {"name": job["name"], "output": job["output"], "success": False, "message": message, "constraints": 0, "conflicts": 0, "time": 0.0}
+
+
+#
+# Parse an input file, which may be shared by multiple jobs
+#
+# MCU descriptions are taken from the cache in cacheDirectory, if given.
+#
+def parseSharedFile(kind, filename, cacheDirectory=None):
+    if kind == "ioc":
+        return IOC(filename)
+    if cacheDirectory is None:
+        mcuXml = CubeXML(filename, errorsAreFatal=False)
+    else:
+        mcuXml = Cache(cacheDirectory).loadCubeXML(filename, errorsAreFatal=False)
+    if not hasattr(mcuXml, "pinTable"):
+        raise ValueError("Failed to parse MCU description file {:s}.".format(filename))
+    return mcuXml
+
+
+#
+# Convert one board, with IOC and MCU description already parsed
+#
+# The netlist is taken from the cache in cacheDirectory, if given.
+#
+def runJob(job, ioc=None, mcuXml=None, instrument=False, profile=False, cacheDirectory=None):
+    if instrument or profile:
+        instrumentation.reset()
+        instrumentation.enable(profile=profile, memory=profile)
+    start = time.perf_counter()
+    result = {"name": job["name"], "output": job["output"], "success": False, "message": "", "constraints": 0, "conflicts": 0}
+    try:
+        # Only the nets of the FPGA are needed
+        if cacheDirectory is None:
+            netlist = loadNetlist(job["netlist"], lazy=True)
+        else:
+            netlist = Cache(cacheDirectory).loadNetlist(job["netlist"])
+        converter = Converter(netlist, job["fpga"], mcu=job["mcu"], ioc=ioc, mcuXml=mcuXml)
+        pcf = converter.convert()
+        pcf.saveToFile(job["output"])
+        result["success"] = True
+        result["constraints"] = len(pcf.getConstraints())
+        result["conflicts"] = len(pcf.getConflicts())
+    except Exception as e:
+        result["message"] = "{:s}: {:s}".format(type(e).__name__, str(e))
+    result["time"] = time.perf_counter() - start
+    if instrument or profile:
+        instrumentation.disable()
+        result["instrumentation"] = instrumentation.getReport()
+    return result
+
+
+#
+# Process all jobs on a process pool
+#
+# Every distinct IOC and MCU description file is parsed only once
+# and the result is shared by all jobs using it.
+#
+def runJobs(jobs, workers=None, instrument=False, profile=False, cacheDirectory=None):
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+
+    # Parse the shared files first
+    shared = {}
+    for job in jobs:
+        if not (job["error"] is None):
+            continue
+        for kind in ["ioc", "mcuxml"]:
+            if not (job[kind] is None):
+                key = (kind, job[kind])
+                if not (key in shared):
+                    shared[key] = executor.submit(parseSharedFile, kind, job[kind], cacheDirectory)
+
+    futures = []
+    for job in jobs:
+        if not (job["error"] is None):
+            futures += [failedResult(job, job["error"])]
+            continue
+        ioc = None
+        mcuXml = None
+        try:
+            if not (job["ioc"] is None):
+                ioc = shared[("ioc", job["ioc"])].result()
+            if not (job["mcuxml"] is None):
+                mcuXml = shared[("mcuxml", job["mcuxml"])].result()
+        except Exception as e:
+            futures += [failedResult(job, "{:s}: {:s}".format(type(e).__name__, str(e)))]
+            continue
+        futures += [executor.submit(runJob, job, ioc, mcuXml, instrument, profile, cacheDirectory)]
+
+    results = []
+    for future in futures:
+        if isinstance(future, dict):
+            results += [future]
+        else:
+            results += [future.result()]
+    executor.shutdown(wait=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the netlists of many boards into FPGA pin constraint files.")
+    parser.add_argument("manifest", help="CSV or JSON list of conversion jobs")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--report", default=None, help="write the per-job results to this JSON file")
+    parser.add_argument("--instrument", action="store_true", help="include phase timings and counters in the report")
+    parser.add_argument("--profile", action="store_true", help="include cProfile and tracemalloc results in the report")
+    parser.add_argument("--cache", nargs="?", const=cache.defaultDirectory, default=None, metavar="DIRECTORY", help="cache parsed netlists and MCU descriptions (default directory: %(const)s)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    jobs = importManifest(args.manifest)
+    results = runJobs(jobs, args.jobs, args.instrument, args.profile, args.cache)
+
+    failed = 0
+    for result in results:
+        if result["success"]:
+            print("[SUCCESS] {:s}: {:d} constraint(s) in {:.3f} s".format(result["name"], result["constraints"], result["time"]))
+        else:
+            failed += 1
+            print("[FAILED]  {:s}: {:s}".format(result["name"], result["message"]))
+    print("{:d} job(s), {:d} failed, {:.3f} s total.".format(len(results), failed, time.perf_counter() - start))
+
+    if not (args.report is None):
+        f = open(args.report, "w")
+        json.dump(results, f, indent=2)
+        f.close()
+
+    if failed > 0:
+        sys.exit(1)
@@ -0,0 +1,416 @@
+#!/usr/bin/python3
+#
+# This file benchmarks the parsers and the conversion pipeline
+# on synthetic inputs of increasing size
+#
+# For every benchmark the run time is measured at several sizes
+# and the scaling exponent between neighbouring sizes is calculated
+# (1.0 means linear, 2.0 quadratic).
+# The results can be saved as JSON and compared against a previous run.
+#
+
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from cache import Cache
+from cubemx_ioc import IOC
+from cubemx_xml import CubeXML
+from edif import EdifNetlist
+from kicad import KiCadNetlist
+from pcf import PCF
+from tango import TangoNetlist
+from telesis import TelesisNetlist
+import verilog
+
+#
+# Designators of the components all synthetic netlists share
+#
+fpgaDesignator = "U1"
+mcuDesignator = "U2"
+
+
+#
+# Generate a synthetic board with the given number of components and nets
+# and pinsPerNet pins on every net; every other net is connected to the FPGA
+# and every fourth net also to the MCU
+#
+# Returns the list of (designator, footprint, description) tuples
+# and the list of (net label, [(designator, pin name), ...]) tuples.
+#
+def generateBoard(components, nets, pinsPerNet, seed=0):
+    rng = random.Random(seed)
+    designators = [fpgaDesignator, mcuDesignator] + ["R{:d}".format(i) for i in range(components - 2)]
+    nextPin = dict([(d, 1) for d in designators])
+
+    parts = [(fpgaDesignator, "BGA256", "FPGA"), (mcuDesignator, "LQFP64", "MCU")]
+    for designator in designators[2:]:
+        parts += [(designator, "0603", "10k")]
+
+    connections = []
+    for i in range(nets):
+        members = []
+        if i % 2 == 0:
+            members += [fpgaDesignator]
+        if i % 4 == 0:
+            members += [mcuDesignator]
+        while len(members) < pinsPerNet:
+            members += [designators[rng.randrange(2, len(designators))]]
+        label = "GND" if i == 1 else "NET{:d}".format(i)
+        pins = []
+        for designator in members:
+            pins += [(designator, str(nextPin[designator]))]
+            nextPin[designator] += 1
+        connections += [(label, pins)]
+    return (parts, connections)
+
+
+#
+# Write a synthetic board (see generateBoard) as Tango netlist
+#
+def generateTango(filename, components, nets, pinsPerNet, seed=0):
+    parts, connections = generateBoard(components, nets, pinsPerNet, seed)
+    f = open(filename, "w")
+    for designator, footprint, description in parts:
+        f.write("[\n{:s}\n{:s}\n{:s}\n\n\n\n]\n".format(designator, footprint, description))
+    for label, pins in connections:
+        f.write("(\n{:s}\n".format(label))
+        for designator, name in pins:
+            f.write("{:s},{:s}\n".format(designator, name))
+        f.write(")\n")
+    f.close()
+
+
+#
+# Write a synthetic board (see generateBoard) as KiCad netlist
+#
+def generateKiCad(filename, components, nets, pinsPerNet, seed=0):
+    parts, connections = generateBoard(components, nets, pinsPerNet, seed)
+    f = open(filename, "w")
+    f.write("(export (version \"E\")\n  (components\n")
+    for designator, footprint, description in parts:
+        f.write("    (comp (ref \"{:s}\")\n      (value \"{:s}\")\n      (footprint \"{:s}\"))\n".format(designator, description, footprint))
+    f.write("  )\n  (nets\n")
+    for i, (label, pins) in enumerate(connections):
+        f.write("    (net (code \"{:d}\") (name \"{:s}\")\n".format(i + 1, label))
+        for designator, name in pins:
+            f.write("      (node (ref \"{:s}\") (pin \"{:s}\") (pintype \"passive\"))\n".format(designator, name))
+        f.write("    )\n")
+    f.write("  )\n)\n")
+    f.close()
+
+
+#
+# Write a synthetic board (see generateBoard) as Telesis netlist
+#
+def generateTelesis(filename, components, nets, pinsPerNet, seed=0):
+    parts, connections = generateBoard(components, nets, pinsPerNet, seed)
+    f = open(filename, "w")
+    f.write("$PACKAGES\n")
+    for designator, footprint, description in parts:
+        f.write("'{:s}' ! '{:s}' ; {:s}\n".format(footprint, description, designator))
+    f.write("$NETS\n")
+    for label, pins in connections:
+        f.write("'{:s}' ;".format(label))
+        for j, (designator, name) in enumerate(pins):
+            if (j > 0) and (j % 8 == 0):
+                f.write(" ,\n")
+            f.write(" {:s}.{:s}".format(designator, name))
+        f.write("\n")
+    f.write("$END\n")
+    f.close()
+
+
+#
+# Write a synthetic board (see generateBoard) as EDIF netlist
+#
+def generateEdif(filename, components, nets, pinsPerNet, seed=0):
+    parts, connections = generateBoard(components, nets, pinsPerNet, seed)
+    pinCounts = {}
+    for label, pins in connections:
+        for designator, name in pins:
+            pinCounts[designator] = max(pinCounts.get(designator, 0), int(name))
+
+    f = open(filename, "w")
+    f.write("(edif board\n  (edifVersion 2 0 0)\n  (edifLevel 0)\n  (keywordMap (keywordLevel 0))\n")
+    f.write("  (library parts (edifLevel 0) (technology (numberDefinition))\n")
+    for designator, footprint, description in parts:
+        f.write("    (cell C_{:s} (cellType GENERIC)\n      (view netlist (viewType NETLIST)\n        (interface\n".format(designator))
+        for i in range(pinCounts.get(designator, 0)):
+            f.write("          (port (rename &{:d} \"{:d}\") (direction INOUT))\n".format(i + 1, i + 1))
+        f.write("        )))\n")
+    f.write("  )\n  (library design (edifLevel 0) (technology (numberDefinition))\n")
+    f.write("    (cell top (cellType GENERIC)\n      (view netlist (viewType NETLIST)\n        (interface)\n        (contents\n")
+    for designator, footprint, description in parts:
+        f.write("          (instance {:s} (viewRef netlist (cellRef C_{:s} (libraryRef parts)))\n".format(designator, designator))
+        f.write("            (property (rename PCB_FOOTPRINT \"PCB Footprint\") (string \"{:s}\"))\n".format(footprint))
+        f.write("            (property Value (string \"{:s}\")))\n".format(description))
+    for label, pins in connections:
+        f.write("          (net {:s}\n            (joined\n".format(label))
+        for designator, name in pins:
+            f.write("              (portRef &{:s} (instanceRef {:s}))\n".format(name, designator))
+        f.write("            ))\n")
+    f.write("        ))))\n  (design board (cellRef top (libraryRef design)))\n)\n")
+    f.close()
+
+
+#
+# Write an STM32CubeMX project with the given number of configured pins
+#
+def generateIOC(filename, signals):
+    f = open(filename, "w")
+    f.write("#MicroXplorer Configuration settings - do not modify\n")
+    f.write("Mcu.Name=STM32SYNTHETIC\n")
+    for i in range(signals):
+        pin = "P{:s}{:d}".format("ABCDEFGHIJK"[(i // 16) % 11], i)
+        f.write("{:s}.Locked=true\n".format(pin))
+        f.write("{:s}.Mode=Synthetic\n".format(pin))
+        f.write("{:s}.Signal=SIG{:d}\n".format(pin, i))
+    f.close()
+
+
+#
+# Write an STM32CubeMX device description with the given number of pins
+#
+def generateMcuXml(filename, pins):
+    f = open(filename, "w")
+    f.write("<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"no\"?>\n")
+    f.write("<Mcu Family=\"STM32F4\" Package=\"LQFP{:d}\" RefName=\"STM32SYNTHETIC\" xmlns=\"http://mcd.rou.st.com/modules.php?name=mcu\">\n".format(pins))
+    f.write("\t<Core>ARM Cortex-M4</Core>\n")
+    for i in range(pins):
+        f.write("\t<Pin Name=\"P{:s}{:d}\" Position=\"{:d}\" Type=\"I/O\">\n".format("ABCDEFGHIJK"[(i // 16) % 11], i, i + 1))
+        f.write("\t\t<Signal Name=\"SIG{:d}\"/>\n".format(i))
+        f.write("\t\t<Signal Name=\"GPIO\"/>\n")
+        f.write("\t</Pin>\n")
+    f.write("</Mcu>\n")
+    f.close()
+
+
+#
+# Write a flattened Yosys netlist with the given number of assigns and cells
+#
+def generateVerilog(filename, assigns, cells):
+    f = open(filename, "w")
+    f.write("/* Generated by benchmark.py */\n\n")
+    f.write("(* top =  1  *)\n")
+    f.write("module top(clk, led);\n")
+    f.write("  input clk;\n")
+    f.write("  output [7:0] led;\n")
+    for i in range(assigns):
+        f.write("  wire _{:d}_;\n".format(i))
+    for i in range(cells):
+        f.write("  SB_LUT4 #(\n    .LUT_INIT(16'h8000)\n  ) _c{:d}_ (\n    .I0(clk),\n    .I1(_{:d}_),\n    .I2(1'h0),\n    .I3(1'h0),\n    .O(_{:d}_)\n  );\n".format(i, i % max(assigns, 1), (i + 1) % max(assigns, 1)))
+    for i in range(assigns):
+        if i % 3 == 0:
+            f.write("  assign _{:d}_ = 1'h0;\n".format(i))
+        else:
+            f.write("  assign _{:d}_ = _{:d}_;\n".format(i, i - 1))
+    f.write("  assign led[0] = _0_;\n")
+    f.write("endmodule\n")
+    f.close()
+
+
+#
+# Return the best run time of a function in seconds
+#
+def measure(function, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if (best is None) or (elapsed < best):
+            best = elapsed
+    return best
+
+
+#
+# The individual benchmarks
+#
+# Each one prepares its input for the given size n in the given directory
+# and returns the function to measure.
+#
+def prepareTangoParse(directory, n):
+    filename = os.path.join(directory, "tango-{:d}.net".format(n))
+    generateTango(filename, components=n, nets=n, pinsPerNet=4)
+    return lambda: TangoNetlist(filename)
+
+
+def prepareKiCadParse(directory, n):
+    filename = os.path.join(directory, "kicad-{:d}.net".format(n))
+    generateKiCad(filename, components=n, nets=n, pinsPerNet=4)
+    return lambda: KiCadNetlist(filename)
+
+
+def prepareTelesisParse(directory, n):
+    filename = os.path.join(directory, "telesis-{:d}.net".format(n))
+    generateTelesis(filename, components=n, nets=n, pinsPerNet=4)
+    return lambda: TelesisNetlist(filename)
+
+
+def prepareEdifParse(directory, n):
+    filename = os.path.join(directory, "edif-{:d}.edn".format(n))
+    generateEdif(filename, components=n, nets=n, pinsPerNet=4)
+    return lambda: EdifNetlist(filename)
+
+
+def prepareElaborate(directory, n):
+    filename = os.path.join(directory, "tango-{:d}.net".format(n))
+    generateTango(filename, components=n, nets=n, pinsPerNet=4)
+    netlist = TangoNetlist(filename)
+    return lambda: netlist.elaborateComponentConnections(fpgaDesignator, mcuDesignator)
+
+
+def prepareLazyElaborate(directory, n):
+    filename = os.path.join(directory, "tango-{:d}.net".format(n))
+    generateTango(filename, components=n, nets=n, pinsPerNet=4)
+    return lambda: TangoNetlist(filename, lazy=True).elaborateComponentConnections(fpgaDesignator, mcuDesignator)
+
+
+def prepareCachedElaborate(directory, n):
+    filename = os.path.join(directory, "tango-{:d}.net".format(n))
+    generateTango(filename, components=n, nets=n, pinsPerNet=4)
+    cache = Cache(os.path.join(directory, "cache"))
+    cache.loadNetlist(filename)
+    return lambda: cache.loadNetlist(filename).elaborateComponentConnections(fpgaDesignator, mcuDesignator)
+
+
+def prepareIOCLookup(directory, n):
+    filename = os.path.join(directory, "ioc-{:d}.ioc".format(n))
+    generateIOC(filename, n)
+    def run():
+        ioc = IOC(filename)
+        for i in range(n):
+            ioc.getPinBySignal("SIG{:d}".format(i))
+    return run
+
+
+def prepareCubeXMLLookup(directory, n):
+    filename = os.path.join(directory, "mcu-{:d}.xml".format(n))
+    generateMcuXml(filename, n)
+    names = ["P{:s}{:d}".format("ABCDEFGHIJK"[(i // 16) % 11], i) for i in range(n)]
+    def run():
+        mcuXml = CubeXML(filename)
+        for name in names:
+            mcuXml.getPinNumber(name)
+    return run
+
+
+def prepareVerilogParse(directory, n):
+    filename = os.path.join(directory, "verilog-{:d}.v".format(n))
+    generateVerilog(filename, assigns=n, cells=n)
+    return lambda: verilog.File(filename)
+
+
+def preparePCFOutput(directory, n):
+    filename = os.path.join(directory, "pcf-{:d}.pcf".format(n))
+    def run():
+        pcf = PCF()
+        for i in range(n):
+            pcf.addConstraint("SIG{:d}".format(i), str(i))
+        pcf.sortBySignal()
+        pcf.saveToFile(filename)
+    return run
+
+
+#
+# Name -> (preparation function, base size)
+#
+benchmarks = {
+    "tango.parse": (prepareTangoParse, 1000),
+    "kicad.parse": (prepareKiCadParse, 1000),
+    "telesis.parse": (prepareTelesisParse, 1000),
+    "edif.parse": (prepareEdifParse, 1000),
+    "netlist.elaborateComponentConnections": (prepareElaborate, 1000),
+    "tango.lazyElaborate": (prepareLazyElaborate, 1000),
+    "cache.elaborate": (prepareCachedElaborate, 1000),
+    "ioc.getPinBySignal": (prepareIOCLookup, 1000),
+    "cubexml.getPinNumber": (prepareCubeXMLLookup, 1000),
+    "verilog.File": (prepareVerilogParse, 1000),
+    "pcf.saveToFile": (preparePCFOutput, 1000),
+}
+
+
+#
+# Run the selected benchmarks at base size times each scale factor
+# and return {name: [{"size": n, "time": seconds, "exponent": e}, ...]}
+#
+def run(names=None, scales=[1, 2, 4, 8], repeat=3):
+    if names is None:
+        names = benchmarks.keys()
+    directory = tempfile.mkdtemp(prefix="netlist2pcf-benchmark-")
+    results = {}
+    try:
+        for name in names:
+            prepare, base = benchmarks[name]
+            curve = []
+            for scale in scales:
+                n = base * scale
+                elapsed = measure(prepare(directory, n), repeat)
+                point = {"size": n, "time": elapsed, "exponent": None}
+                if (len(curve) > 0) and (curve[-1]["time"] > 0) and (elapsed > 0):
+                    point["exponent"] = math.log(elapsed / curve[-1]["time"]) / math.log(n / curve[-1]["size"])
+                curve += [point]
+                print("{:40s} n={:8d} {:10.4f} s{:s}".format(name, n, elapsed, "" if point["exponent"] is None else "  (exponent {:.2f})".format(point["exponent"])))
+            results[name] = curve
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+#
+# Compare results against a baseline and return a list of regressions:
+# benchmarks, which got slower than tolerance times the baseline at any common size
+#
+def compare(results, baseline, tolerance=1.5):
+    regressions = []
+    for name, curve in results.items():
+        if not (name in baseline):
+            continue
+        baselineTimes = dict([(point["size"], point["time"]) for point in baseline[name]])
+        for point in curve:
+            reference = baselineTimes.get(point["size"])
+            if (reference is None) or (reference <= 0):
+                continue
+            if point["time"] > reference * tolerance:
+                regressions += ["{:s} at n={:d}: {:.4f} s instead of {:.4f} s".format(name, point["size"], point["time"], reference)]
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the parsers and the conversion pipeline on synthetic inputs.")
+    parser.add_argument("benchmark", nargs="*", help="benchmarks to run (default: all of {:s})".format(", ".join(benchmarks.keys())))
+    parser.add_argument("--scales", default="1,2,4,8", help="comma-separated multiples of the base sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs per measurement (the best one counts)")
+    parser.add_argument("--output", default=None, help="save the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="compare against results previously saved with --output")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="slowdown factor reported as a regression")
+    args = parser.parse_args()
+
+    for name in args.benchmark:
+        if not (name in benchmarks):
+            print("Error: Unknown benchmark {:s}.".format(name))
+            sys.exit(2)
+
+    results = run(args.benchmark if len(args.benchmark) > 0 else None, [int(s) for s in args.scales.split(",")], args.repeat)
+
+    if not (args.output is None):
+        f = open(args.output, "w")
+        json.dump(results, f, indent=2)
+        f.close()
+
+    if not (args.compare is None):
+        f = open(args.compare, "r")
+        baseline = json.load(f)
+        f.close()
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("Regression: " + regression)
+        if len(regressions) > 0:
+            sys.exit(1)
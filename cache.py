@@ -0,0 +1,263 @@
+#!/usr/bin/python3
+#
+# This file provides an on-disk cache for parsed input files,
+# so that unchanged netlists and MCU descriptions
+# do not need to be parsed again on every run
+#
+
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+import cubemx_xml
+import formats
+import netlists
+from netlists import FrozenNetlist
+
+#
+# Default location and size limit of the cache
+#
+defaultDirectory = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "netlist2pcf")
+defaultMaxSize = 256 * 1024 * 1024
+
+#
+# Temporary files older than this (in seconds) are left over
+# from interrupted writers and are deleted on eviction
+#
+staleTemporaryAge = 3600
+
+
+#
+# Calculate the SHA-256 hash of a file's content
+#
+def hashFile(filename):
+    h = hashlib.sha256()
+    f = open(filename, "rb")
+    while True:
+        chunk = f.read(1024 * 1024)
+        if len(chunk) == 0:
+            break
+        h.update(chunk)
+    f.close()
+    return h.hexdigest()
+
+
+#
+# A directory of pickled objects, keyed by
+# kind of object, parser/format version and source file hash
+#
+# Least recently used entries are evicted,
+# when the total size exceeds the given limit.
+#
+class Cache:
+    def __init__(self, directory=None, maxSize=defaultMaxSize):
+        if directory is None:
+            directory = defaultDirectory
+        self.directory = directory
+        self.maxSize = maxSize
+
+    #
+    # Return the key of the cache entry for the given source file
+    # or None, if the file can not be read
+    #
+    # version is a string, which changes whenever
+    # the format of the cached object changes
+    #
+    def getKey(self, kind, version, filename):
+        try:
+            return "{:s}-v{:s}-{:s}".format(kind, version, hashFile(filename))
+        except OSError:
+            return None
+
+    #
+    # Return the cached object or None, if there is no valid entry
+    #
+    def load(self, key):
+        if key is None:
+            return None
+        entry = os.path.join(self.directory, key + ".pickle")
+        try:
+            f = open(entry, "rb")
+        except OSError:
+            return None
+        try:
+            obj = pickle.load(f)
+        except Exception:
+            print("Warning: Ignoring corrupt cache entry {:s}.".format(entry))
+            obj = None
+        f.close()
+        if not (obj is None):
+            # Mark as recently used
+            try:
+                os.utime(entry)
+            except OSError:
+                pass
+        return obj
+
+    #
+    # Store an object in the cache
+    #
+    # The cache is optional, so failures are reported as warnings only.
+    #
+    def store(self, key, obj):
+        if key is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            entry = os.path.join(self.directory, key + ".pickle")
+
+            # Write to a temporary file first, so that concurrent
+            # readers never see incomplete entries
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            print("Warning: Unable to write to cache directory {:s}.".format(self.directory))
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, entry)
+        except BaseException as e:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            if not isinstance(e, Exception):
+                # e.g. KeyboardInterrupt
+                raise
+            print("Warning: Unable to write cache entry {:s}: {:s}".format(entry, str(e)))
+            return
+        self.evict()
+
+    #
+    # Delete the least recently used entries
+    # until the cache fits into the size limit
+    #
+    def evict(self):
+        entries = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not (name.endswith(".pickle") or name.endswith(".tmp")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                if name.endswith(".tmp"):
+                    if now - stat.st_mtime > staleTemporaryAge:
+                        os.remove(path)
+                    continue
+            except OSError:
+                continue
+            entries += [(stat.st_mtime, stat.st_size, path)]
+            total += stat.st_size
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.maxSize:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    #
+    # Remove all entries
+    #
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".pickle"):
+                os.remove(os.path.join(self.directory, name))
+
+    #
+    # Return the parsed netlist, from the cache if possible
+    #
+    # Cached netlists are thawed lazily, i.e. components and nets
+    # are only created when they are accessed.
+    #
+    def loadNetlist(self, filename, format=None, debug=False):
+        if format is None:
+            format = formats.detectFormat(filename)
+            if format is None:
+                raise ValueError("Unable to detect the format of netlist {:s}.".format(filename))
+        if not (format in formats.formats):
+            raise ValueError("Unknown netlist format {:s}.".format(format))
+
+        version = "{:d}.{:d}".format(formats.parserVersions[format], netlists.frozenNetlistVersion)
+        key = self.getKey(format, version, filename)
+        frozen = self.load(key)
+        if isinstance(frozen, FrozenNetlist):
+            return frozen.thaw(formats.formats[format]())
+
+        netlist = formats.loadNetlist(filename, format, debug)
+        self.store(key, FrozenNetlist(netlist))
+        return netlist
+
+    #
+    # Return the parsed Tango netlist, from the cache if possible
+    #
+    def loadTangoNetlist(self, filename, debug=False):
+        return self.loadNetlist(filename, "tango", debug)
+
+    #
+    # Return the MCU description, from the cache if possible
+    #
+    def loadCubeXML(self, filename, errorsAreFatal=True):
+        key = self.getKey("cubexml", str(cubemx_xml.parserVersion), filename)
+        entry = self.load(key)
+        if isinstance(entry, tuple) and (len(entry) == 2):
+            attributes, pinTable = entry
+            return cubemx_xml.CubeXML(filename, errorsAreFatal, pinTable=pinTable, attributes=attributes)
+
+        mcu = cubemx_xml.CubeXML(filename, errorsAreFatal)
+        if hasattr(mcu, "pinTable"):
+            self.store(key, (mcu.getAttributes(), mcu.getPinTable()))
+        return mcu
+
+
+if __name__ == "__main__":
+    # Test data: A small board in Tango format
+    content = "[\nU1\nBGA256\nFPGA\n]\n[\nU2\nLQFP64\nMCU\n]\n[\nR1\n\n10k\n]\n" \
+              "(\nSPI_CLK\nU1,A1\nU2,5\n)\n(\nspi_clk\nU1,A2\nR1,1\n)\n(\nGND\nU1,G1\nU2,8\nR1,2\n)\n"
+
+    #
+    # Return everything the netlist answers about its components and nets
+    #
+    def describe(netlist):
+        result = []
+        for designator in ["U1", "U2", "R1"]:
+            component = netlist.getComponent(designator)
+            result += [(component.getFootprint(), component.getDescription())]
+            result += [[(pin.getName(), netlist.getNetOnPin(pin).getLabel()) for pin in component.getPins()]]
+            result += [[net.getLabel() for net in netlist.getComponentNets(designator)]]
+        result += [[(net.getLabel(), [str(pin) for pin in net.getPins()]) for net in netlist.getNets()]]
+        result += [[(c.getDesignator(), [pin.getName() for pin in c.getPins()]) for c in netlist.getComponents()]]
+        return result
+
+    # Test
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, "board.net")
+    f = open(filename, "w")
+    f.write(content)
+    f.close()
+    cache = Cache(os.path.join(directory, "cache"))
+    miss = describe(cache.loadNetlist(filename))
+    hit = describe(cache.loadNetlist(filename))
+    expected = describe(formats.loadNetlist(filename))
+    cache.clear()
+    os.remove(filename)
+    os.rmdir(cache.directory)
+    os.rmdir(directory)
+
+    # Test result evaluation
+    if miss != expected:
+        print("Test failed: A cache miss returned {:s} instead of {:s}.".format(str(miss), str(expected)))
+        exit(5)
+    if hit != expected:
+        print("Test failed: A cache hit returned {:s} instead of {:s}.".format(str(hit), str(expected)))
+        exit(5)
+    print("Test succeeded: Cache hit and miss return the same netlist.")
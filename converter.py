@@ -0,0 +1,244 @@
+#!/usr/bin/python3
+#
+# This file generates the pin constraints of an FPGA
+# from a board netlist and, optionally,
+# the STM32CubeMX configuration of a microcontroller on that board
+#
+
+from instrumentation import instrumentation
+from netlists import diffSignatures, getComponentSignatures, getNetSignatures
+from pcf import PCF
+
+
+#
+# Converts the connections of an FPGA into pin constraints
+#
+# Every signal net of the FPGA becomes one constraint:
+# The signal is named after the net, unless the net is connected to the MCU,
+# in which case the alternate function (or GPIO label) configured
+# for the MCU pin in the IOC file is used.
+#
+class Converter:
+    def __init__(self, netlist, fpga, mcu=None, ioc=None, mcuXml=None):
+        self.netlist = netlist
+        self.fpga = fpga.upper().strip()
+        self.mcu = None if mcu is None else mcu.upper().strip()
+        self.ioc = ioc
+        self.mcuXml = mcuXml
+        self.pcf = None
+        # Upper-cased net label -> (signal, pin) of accepted constraints
+        self.constraintsByNet = {}
+        # Upper-cased labels of nets with rejected constraints
+        self.rejectedNets = set()
+        # Component and net signatures of the netlist,
+        # calculated on the first update
+        self.signatures = None
+
+    #
+    # Return the signal name of the given MCU pin (object reference)
+    # as configured in the IOC file, or None
+    #
+    def getMcuSignal(self, pin):
+        if self.ioc is None:
+            return None
+        pinName = pin.getName()
+        if not (self.mcuXml is None):
+            # The netlist holds pin numbers, the IOC file pin names
+            pinName = self.mcuXml.getPinName(pinName)
+            if pinName is None:
+                return None
+        return self.ioc.getSignalOnPin(pinName, acceptLabelMatch=True)
+
+    #
+    # Return the constraint for the given net as (signal, FPGA pin name) tuple
+    # or None, if the net does not connect the FPGA to anything
+    #
+    def getConstraint(self, net):
+        fpgaPin = net.getPin(self.fpga)
+        if fpgaPin is None:
+            return None
+        if net.isPower() or (len(net.getPins()) < 2):
+            return None
+
+        signal = None
+        if not (self.mcu is None):
+            mcuPin = net.getPin(self.mcu)
+            if not (mcuPin is None):
+                signal = self.getMcuSignal(mcuPin)
+        if signal is None:
+            signal = net.getLabel()
+        return (signal, fpgaPin.getName())
+
+    #
+    # Add the constraint of a net to the PCF
+    #
+    def addNet(self, net, constraint=None):
+        key = net.getLabel().upper()
+        if constraint is None:
+            constraint = self.getConstraint(net)
+        if constraint is None:
+            return
+        if self.pcf.addConstraint(constraint[0], constraint[1]):
+            self.constraintsByNet[key] = constraint
+        else:
+            self.rejectedNets.add(key)
+
+    #
+    # Remove the constraint of a net from the PCF
+    #
+    def removeNet(self, key):
+        self.rejectedNets.discard(key)
+        constraint = self.constraintsByNet.pop(key, None)
+        if not (constraint is None):
+            self.pcf.removeSignal(constraint[0])
+
+    #
+    # Generate the pin constraints of all FPGA nets
+    #
+    # Raises ValueError, if the FPGA or the MCU is not part of the netlist.
+    #
+    def convert(self):
+        self.pcf = None
+        for designator in [self.fpga, self.mcu]:
+            if not (designator is None) and (self.netlist.getComponentByDesignator(designator) is None):
+                raise ValueError("Component {:s} not found in the netlist.".format(designator))
+        self.pcf = PCF()
+        self.constraintsByNet = {}
+        self.rejectedNets = set()
+        with instrumentation.phase("elaborate"):
+            nets = [net for net in self.netlist.getComponentNets(self.fpga).keys() if not net.isPower()]
+        with instrumentation.phase("map"):
+            for net in nets:
+                self.addNet(net)
+            self.pcf.sortBySignal()
+        return self.pcf
+
+    #
+    # Return the (component, net) signatures of a netlist
+    #
+    def getSignatures(self, netlist):
+        return (getComponentSignatures(netlist), getNetSignatures(netlist))
+
+    #
+    # Switch to a new revision of the netlist and
+    # patch the existing pin constraints, only recomputing
+    # the nets which were added, removed or changed.
+    # Returns the updated PCF, which equals the result of convert().
+    #
+    # The constraints are assigned first come, first served in netlist order.
+    # If a patched net claims a signal or pin held by a net further down,
+    # the assignments can shift all over the FPGA,
+    # so the conversion is repeated from scratch instead.
+    #
+    def update(self, netlist):
+        if self.pcf is None:
+            self.netlist = netlist
+            return self.convert()
+
+        with instrumentation.phase("elaborate"):
+            if self.signatures is None:
+                self.signatures = self.getSignatures(self.netlist)
+            signatures = self.getSignatures(netlist)
+            componentDiff = diffSignatures(self.signatures[0], signatures[0])
+            netDiff = diffSignatures(self.signatures[1], signatures[1])
+        self.signatures = signatures
+        self.netlist = netlist
+        added, removed, changed = componentDiff
+        if len((added | removed | changed) & set([self.fpga, self.mcu])) > 0:
+            # The FPGA or MCU itself was replaced
+            return self.convert()
+
+        added, removed, changed = netDiff
+        retry = self.rejectedNets - removed - changed
+        for key in removed | changed:
+            self.removeNet(key)
+
+        # All rejected nets are retried below,
+        # so the conflicts are recorded again if still present
+        self.pcf.clearConflicts()
+        pending = added | changed | retry
+        self.rejectedNets -= pending
+
+        nets = list(self.netlist.getComponentNets(self.fpga).keys())
+        # Upper-cased label -> position of the first net with that label
+        order = {}
+        for net in nets:
+            order.setdefault(net.getLabel().upper(), len(order))
+        # Signal/pin -> upper-cased label of the net it is assigned to
+        holders = {}
+        for key, constraint in self.constraintsByNet.items():
+            holders[("signal", constraint[0])] = key
+            holders[("pin", constraint[1])] = key
+
+        for net in nets:
+            key = net.getLabel().upper()
+            if not (key in pending):
+                continue
+            constraint = self.getConstraint(net)
+            if constraint is None:
+                continue
+            for holder in [holders.get(("signal", constraint[0])), holders.get(("pin", constraint[1]))]:
+                if not (holder is None) and (order.get(holder, -1) > order[key]):
+                    return self.convert()
+            self.addNet(net, constraint)
+            if key in self.constraintsByNet:
+                holders[("signal", constraint[0])] = key
+                holders[("pin", constraint[1])] = key
+        self.pcf.sortBySignal()
+        return self.pcf
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    from cubemx_ioc import IOC
+    from tango import TangoNetlist
+
+    # Test data: An FPGA (U1) connected to an MCU (U2) and a connector (J1);
+    # PA15 is configured as SPI1_NSS in the IOC file
+    components = "[\nU1\nBGA256\nFPGA\n]\n[\nU2\nLQFP64\nMCU\n]\n[\nJ1\nHDR10\nHeader\n]\n"
+    base = [("NSS_NET", ["U1,12", "U2,PA15"]), ("LED", ["U1,5", "J1,1"]), ("BUTTON", ["U1,6", "J1,2"])]
+    revisions = {
+        # A net named like the MCU signal ahead of the MCU net
+        "add": [("SPI1_NSS", ["U1,30", "J1,3"])] + base,
+        "remove": base[1:],
+        "rename": [("NSS_NET", ["U1,12", "U2,PA15"]), ("USER_LED", ["U1,5", "J1,1"]), ("BUTTON", ["U1,6", "J1,2"])],
+        "conflict": base + [("LED2", ["U1,5", "J1,4"])],
+    }
+
+    directory = tempfile.mkdtemp()
+
+    #
+    # Return the netlist made of the given nets
+    #
+    def createNetlist(name, nets):
+        filename = os.path.join(directory, name + ".net")
+        f = open(filename, "w")
+        f.write(components)
+        for label, pins in nets:
+            f.write("(\n{:s}\n{:s}\n)\n".format(label, "\n".join(pins)))
+        f.close()
+        netlist = TangoNetlist(filename)
+        os.remove(filename)
+        return netlist
+
+    # Test
+    ioc = IOC("tests/demo-cubemx-project.ioc")
+    failed = []
+    for name, nets in revisions.items():
+        # Back and forth between the base and the revision
+        converter = Converter(createNetlist("base", base), "U1", mcu="U2", ioc=ioc)
+        converter.convert()
+        for revision in [nets, base, nets]:
+            updated = converter.update(createNetlist(name, revision))
+            expected = Converter(createNetlist(name, revision), "U1", mcu="U2", ioc=ioc).convert()
+            if (updated.getConstraints() != expected.getConstraints()) or (sorted(updated.getConflicts()) != sorted(expected.getConflicts())):
+                failed += [name]
+                break
+    os.rmdir(directory)
+
+    # Test result evaluation
+    if len(failed) > 0:
+        print("Test failed: update() differs from convert() for {:s}.".format(", ".join(failed)))
+        exit(5)
+    print("Test succeeded: update() equals convert() for {:s}.".format(", ".join(revisions.keys())))
@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+#
+# This file indexes a whole STM32CubeMX device database (db/mcu)
+# for fast lookups across MCU families, e.g.
+# "which parts route SPI1_NSS to pin 33?"
+#
+
+import argparse
+import concurrent.futures
+import os
+import pickle
+import sys
+import tempfile
+
+import cubemx_xml
+
+#
+# Increment, whenever the layout of the index changes
+#
+indexVersion = 1
+
+
+#
+# Parse one device description for the index
+# and return (RefName, Package, filename, pin table) or None
+#
+def parseDevice(filename):
+    try:
+        mcu = cubemx_xml.CubeXML(filename, errorsAreFatal=False)
+    except Exception:
+        return None
+    if not hasattr(mcu, "pinTable"):
+        return None
+    return (mcu.getRefName(), mcu.getPackage(), os.path.basename(filename), mcu.getPinTable())
+
+
+#
+# Suppress the error messages of CubeXML for files,
+# which are not device descriptions (e.g. families.xml)
+#
+def parseDeviceQuietly(filename):
+    f = open(os.devnull, "w")
+    stdout = sys.stdout
+    sys.stdout = f
+    try:
+        return parseDevice(filename)
+    finally:
+        sys.stdout = stdout
+        f.close()
+
+
+#
+# Index of the pins and alternate functions of many MCUs
+#
+class DeviceIndex:
+    def __init__(self, filename=None):
+        # Device ID -> (RefName, Package, filename)
+        self.devices = []
+        # Device ID -> pin table as in CubeXML.getPinTable()
+        self.pinTables = []
+        # Upper-cased RefName -> device ID
+        self.deviceIds = {}
+        # Upper-cased signal -> {position: [device IDs]}
+        self.signalIndex = {}
+        if not (filename is None):
+            self.load(filename)
+
+    #
+    # Parse all device descriptions in the given directory
+    # (e.g. STM32CubeMX/db/mcu) in parallel and add them to the index
+    #
+    def build(self, directory, workers=None):
+        filenames = sorted([os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith(".xml")])
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        for device in executor.map(parseDeviceQuietly, filenames, chunksize=16):
+            if not (device is None):
+                self.addDevice(device)
+        executor.shutdown(wait=True)
+
+    #
+    # Add a parsed device (as returned by parseDevice) to the index
+    #
+    def addDevice(self, device):
+        refName, package, filename, pinTable = device
+        if refName is None:
+            return
+        i = len(self.devices)
+        self.devices += [(refName, package, filename)]
+        self.pinTables += [pinTable]
+        self.deviceIds.setdefault(refName.upper(), i)
+        for name, position, pinType, signals in pinTable:
+            for signal in signals:
+                positions = self.signalIndex.setdefault(signal.upper(), {})
+                positions.setdefault(position, []).append(i)
+
+    #
+    # Write the index to a file (atomically)
+    #
+    def save(self, filename):
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        f = os.fdopen(fd, "wb")
+        pickle.dump((indexVersion, self.devices, self.pinTables, self.signalIndex), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.close()
+        os.replace(tmp, filename)
+
+    #
+    # Read an index written by save()
+    #
+    def load(self, filename):
+        f = open(filename, "rb")
+        version, self.devices, self.pinTables, self.signalIndex = pickle.load(f)
+        f.close()
+        if version != indexVersion:
+            raise ValueError("Index {:s} was created by an incompatible version. Please rebuild it.".format(filename))
+        self.deviceIds = {}
+        for i, device in enumerate(self.devices):
+            self.deviceIds.setdefault(device[0].upper(), i)
+
+    #
+    # Return the RefNames of all indexed devices
+    #
+    def getRefNames(self):
+        return [device[0] for device in self.devices]
+
+    #
+    # Return the device with the given RefName as CubeXML object or None
+    #
+    def getDevice(self, refName):
+        i = self.deviceIds.get(refName.upper())
+        if i is None:
+            return None
+        refName, package, filename = self.devices[i]
+        return cubemx_xml.CubeXML(filename, pinTable=self.pinTables[i], attributes={"RefName": refName, "Package": package})
+
+    #
+    # Return the RefNames of the devices which provide the given signal (e.g. SPI1_NSS),
+    # optionally only on the given pin position (e.g. 33) and in the given package
+    #
+    def findDevices(self, signal, position=None, package=None):
+        positions = self.signalIndex.get(signal.upper(), {})
+        if position is None:
+            ids = set()
+            for deviceIds in positions.values():
+                ids.update(deviceIds)
+        else:
+            if str(position).isdigit():
+                position = int(position)
+            ids = set(positions.get(position, []))
+        if not (package is None):
+            ids = [i for i in ids if (self.devices[i][1] or "").upper() == package.upper()]
+        return [self.devices[i][0] for i in sorted(ids)]
+
+    #
+    # Return the pin positions of the given device, which provide the given signal
+    #
+    def findPositions(self, refName, signal):
+        i = self.deviceIds.get(refName.upper())
+        if i is None:
+            return []
+        return [position for position, deviceIds in self.signalIndex.get(signal.upper(), {}).items() if i in deviceIds]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index an STM32CubeMX device database and query it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index all device descriptions in a directory")
+    build.add_argument("directory", help="device database, e.g. STM32CubeMX/db/mcu")
+    build.add_argument("index", help="index file to write")
+    build.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    query = commands.add_parser("query", help="find devices providing a signal")
+    query.add_argument("index", help="index file created with build")
+    query.add_argument("signal", help="alternate function, e.g. SPI1_NSS")
+    query.add_argument("--pin", default=None, help="pin position, e.g. 33 or A1")
+    query.add_argument("--package", default=None, help="package, e.g. LQFP64")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = DeviceIndex()
+        index.build(args.directory, args.jobs)
+        index.save(args.index)
+        print("Indexed {:d} device(s).".format(len(index.devices)))
+    else:
+        index = DeviceIndex(args.index)
+        for refName in index.findDevices(args.signal, args.pin, args.package):
+            print(refName)
@@ -1,5 +1,7 @@
 #!/usr/bin/python3
 
+from instrumentation import instrumentation
+
 #
 # STMCubeMX configuration file for a microcontroller
 #
@@ -8,46 +10,96 @@ class IOC:
     # Import the give file
     #
     def __init__(self, filename):
-        f = open(filename, "r")
-        self.lines = f.read().split("\n")
-        f.close()
+        # Upper-cased key -> value
+        self.values = {}
+        # Upper-cased signal -> pin
+        self.pinsBySignal = {}
+        # Upper-cased GPIO label -> pin
+        self.pinsByLabel = {}
+
+        with instrumentation.phase("parse"):
+            f = open(filename, "r")
+            for line in f:
+                self.parseLine(line.rstrip("\r\n"))
+            f.close()
+
+    #
+    # Parse one "key=value" line and update the indexes
+    #
+    def parseLine(self, line):
+        if len(line) == 0:
+            return
+        if line[0] == "#":
+            return
+        i = line.find("=")
+        if i < 0:
+            return
+        key = line[:i].upper()
+        value = line[i+1:]
+        if key in self.values:
+            return
+        self.values[key] = value
+
+        # Pin configuration, e.g. PA15.Signal=SPI1_NSS
+        j = key.rfind(".")
+        if j < 0:
+            return
+        pin = line[:j]
+        attribute = key[j+1:]
+        if attribute == "SIGNAL":
+            self.pinsBySignal.setdefault(value.upper(), pin)
+        elif attribute == "GPIO_LABEL":
+            self.pinsByLabel.setdefault(value.upper(), pin)
+
+    #
+    # Return the value of the given key (not case-sensitive)
+    #
+    def getValue(self, key):
+        return self.values.get(key.upper())
 
     #
     # Extract the name of the MCU
     # which is being configured in this file
     #
     def getMcuName(self):
-        for line in self.lines:
-            if len(line) == 0:
-                continue
-            if line[0] == "#":
-                continue
-            if line.upper().find("MCU.NAME=") > -1:
-                name = line.split("=")[1]
-                return name
-        return None
+        return self.getValue("Mcu.Name")
 
     #
     # Find and return the pin for which the given
     # alternate function is configured
     #
     def getPinBySignal(self, af, acceptLabelMatch=False):
+        instrumentation.count("lookups.iocSignal")
         AF = af.upper()
-        for line in self.lines:
-            if len(line) == 0:
-                continue
-            if line[0] == "#":
-                continue
 
-            # A label match has priority over a signal match
-            if acceptLabelMatch and (line.upper().find(".GPIO_LABEL=" + AF) > -1):
-                pin = line.split(".")[0]
-                return pin
+        # A label match has priority over a signal match
+        if acceptLabelMatch and (AF in self.pinsByLabel):
+            return self.pinsByLabel[AF]
+
+        return self.pinsBySignal.get(AF)
+
+    #
+    # Return the set of pins (e.g. PA15), which have a signal configured
+    #
+    def getConfiguredPins(self):
+        return set(self.pinsBySignal.values())
+
+    #
+    # Return the alternate function configured for the given pin (e.g. PA15)
+    # or None, if the pin is unused or a plain GPIO
+    #
+    def getSignalOnPin(self, pin, acceptLabelMatch=False):
+        instrumentation.count("lookups.iocPin")
+        # A label has priority over a signal
+        if acceptLabelMatch:
+            label = self.getValue(pin + ".GPIO_Label")
+            if not (label is None):
+                return label
 
-            if line.upper().find(".SIGNAL=" + AF) > -1:
-                pin = line.split(".")[0]
-                return pin
-        return None
+        signal = self.getValue(pin + ".Signal")
+        if (signal is None) or signal.upper().startswith("GPIO_"):
+            return None
+        return signal
 
 
 #
@@ -57,4 +109,4 @@ if __name__ == "__main__":
     f = IOC("tests/demo-cubemx-project.ioc")
     print("MCU name: {:s}".format(f.getMcuName()))
     net = "SPI1_NSS"
-    print("Function {:s} is configured to: {:s}".format(net, f.getPinByAlternateFunction(net)))
+    print("Function {:s} is configured to: {:s}".format(net, f.getPinBySignal(net)))
@@ -1,14 +1,37 @@
 #!/usr/bin/python3
 
-from xml.dom import minidom
+import xml.etree.ElementTree as ElementTree
 import os, sys
+from instrumentation import instrumentation
+
+#
+# Increment, whenever the extracted pin table changes,
+# in order to invalidate cached pin tables
+#
+parserVersion = 3
+
+
+#
+# Strip the namespace from an ElementTree tag
+#
+def localName(tag):
+    i = tag.rfind("}")
+    if i > -1:
+        return tag[i+1:]
+    return tag
 
 
 #
 # Class to allow operations on CubeMX MCU device parameter files
 #
 class CubeXML:
-    def __init__(self, filename, errorsAreFatal=True):
+    def __init__(self, filename, errorsAreFatal=True, pinTable=None, attributes=None):
+        # Pin table already known (e.g. loaded from the cache)?
+        if not (pinTable is None):
+            self.attributes = {} if attributes is None else attributes
+            self.indexPinTable(pinTable)
+            return
+
         # Does the file exist?
         if not os.path.exists(filename):
             print("Error: File not found.")
@@ -18,54 +41,138 @@ class CubeXML:
 
         # Import XML
         try:
-            self.xml = minidom.parse(filename)
-        except:
+            with instrumentation.phase("parse"):
+                pinTable = self.parsePinTable(filename)
+        except ElementTree.ParseError:
             print("Error: Failed to parse MCU description file.")
             if errorsAreFatal:
                 sys.exit(4)
             return
 
-        # Find XML node with MCU configuration
-        results = self.xml.getElementsByTagName("Mcu")
-        if len(results) < 1:
+        if pinTable is None:
             print("Error: Root node (\"<Mcu ...\") not found in MCU description file.")
             if errorsAreFatal:
                 sys.exit(5)
             return
-        self.rootNode = results[0]
 
-        # Extract a list of pins for this MCU
-        self.pins = self.rootNode.getElementsByTagName("Pin")
+        self.indexPinTable(pinTable)
 
     #
-    # Iterate over all pins and return the matching XML element
+    # Stream through the XML file and extract a list of
+    # (name, position, type, signals) tuples from the <Pin> elements
+    # and the attributes of the root node (e.g. RefName and Package),
+    # discarding everything else.
+    # Positions are integers, except for ball grid arrays (e.g. "A1").
+    # Returns None, if the root node is not <Mcu>.
     #
-    def getPin(self, pinNumber=None, pinName=None):
-        for pin in self.pins:
-            keys = pin.attributes.keys()
-
-            # If the pin's name matches...
-            key = "Name"
-            if not (key in keys):
-                continue
-            name = pin.attributes[key].value
-
-            # ...then extract the pin number
-            key = "Position"
-            if not (key in keys):
+    def parsePinTable(self, filename):
+        pinTable = []
+        root = None
+        for event, element in ElementTree.iterparse(filename, events=("start", "end")):
+            if root is None:
+                # The first event is the start of the root node
+                root = element
+                if localName(root.tag) != "Mcu":
+                    return None
+                self.attributes = dict(root.attrib)
                 continue
-            try:
-                position = int(pin.attributes[key].value)
-            except:
+            if event != "end":
                 continue
 
-            if (not (pinNumber is None)) and (position == pinNumber):
-                return name
+            if localName(element.tag) == "Pin":
+                name = element.get("Name")
+                position = element.get("Position", "").strip()
+                if position.isdigit():
+                    position = int(position)
+                if not ((name is None) or (position == "")):
+                    signals = tuple([s.get("Name") for s in element if (localName(s.tag) == "Signal") and not (s.get("Name") is None)])
+                    pinTable += [(name, position, element.get("Type", ""), signals)]
+
+            # Release the memory of processed top-level elements
+            if element in root:
+                root.remove(element)
+        return pinTable
+
+    #
+    # Build the lookup tables from a pin table
+    #
+    def indexPinTable(self, pinTable):
+        instrumentation.count("mcuPins", len(pinTable))
+        self.pinTable = pinTable
+        self.pinNumbers = {}
+        self.pinNames = {}
+        self.pinTypes = {}
+        self.pinSignals = {}
+        # Upper-cased signal (e.g. SPI1_NSS) -> names of the pins providing it
+        self.pinsBySignal = {}
+        # (upper-cased signal, pin name) pairs already indexed
+        indexed = set()
+        for name, position, pinType, signals in pinTable:
+            self.pinNumbers.setdefault(name, position)
+            self.pinNames.setdefault(position, name)
+            self.pinTypes.setdefault(name, pinType)
+            self.pinSignals.setdefault(name, signals)
+            for signal in signals:
+                key = (signal.upper(), name)
+                if not (key in indexed):
+                    indexed.add(key)
+                    self.pinsBySignal.setdefault(key[0], [])
+                    self.pinsBySignal[key[0]] += [name]
+
+    #
+    # Return the list of (name, position, type, signals) tuples of this MCU
+    #
+    def getPinTable(self):
+        return self.pinTable
+
+    #
+    # Return the attributes of the root node
+    #
+    def getAttributes(self):
+        return self.attributes
+
+    #
+    # Return the part name, e.g. STM32F446R(C-E)Tx
+    #
+    def getRefName(self):
+        return self.attributes.get("RefName")
 
-            if (not (pinName is None)) and (name == pinName):
-                return position
+    #
+    # Return the package name, e.g. LQFP64
+    #
+    def getPackage(self):
+        return self.attributes.get("Package")
+
+    #
+    # Return the name or position of the matching pin
+    #
+    def getPin(self, pinNumber=None, pinName=None):
+        if not (pinNumber is None):
+            return self.pinNames.get(pinNumber)
+        if not (pinName is None):
+            return self.pinNumbers.get(pinName)
         return None
 
+    #
+    # Returns the type (e.g. I/O or Power) of the pin with the given name
+    #
+    def getPinType(self, pinName):
+        return self.pinTypes.get(pinName)
+
+    #
+    # Returns the names of the pins (e.g. [PA4, PA15]), which can be
+    # configured for the given alternate function (e.g. SPI1_NSS)
+    #
+    def getCandidatePins(self, signal):
+        instrumentation.count("lookups.mcuSignal")
+        return self.pinsBySignal.get(signal.upper(), [])
+
+    #
+    # Returns the alternate functions the given pin (e.g. PA4) can be configured for
+    #
+    def getPinSignals(self, pinName):
+        return self.pinSignals.get(pinName, ())
+
     #
     # Returns the pin number (e.g. 2) of the given pin name (e.g. PC13)
     #
@@ -74,10 +181,12 @@ class CubeXML:
         if pinName == "":
             return None
 
-        return self.getPin(pinName=pinName)
+        instrumentation.count("lookups.mcuPinNumber")
+        return self.pinNumbers.get(pinName)
 
     #
     # Returns the pin name (e.g. PC13) of the given pin number (e.g. 2)
+    # or ball (e.g. A1)
     #
     def getPinName(self, pinNumber):
         # Acceptable argument?
@@ -86,9 +195,12 @@ class CubeXML:
             if number < 1:
                 return None
         except:
-            return None
+            number = str(pinNumber).strip()
+            if len(number) == 0:
+                return None
 
-        return self.getPin(pinNumber=number)
+        instrumentation.count("lookups.mcuPinName")
+        return self.pinNames.get(number)
 
 
 #
@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+
+import logging
+from netlists import *
+from instrumentation import debugOutput, getLogger, instrumentation
+from tokenizer import findChild, findChildren, iterElements, readChunks, tokenizeSExpressions
+
+logger = getLogger("edif")
+
+#
+# Increment, whenever the parser output changes,
+# in order to invalidate cached netlists
+#
+parserVersion = 1
+
+
+#
+# Property names (upper-cased, spaces replaced by underscores)
+# which hold the footprint or the description of an instance
+#
+footprintProperties = ["PCB_FOOTPRINT", "PCBFOOTPRINT", "FOOTPRINT", "PACKAGE"]
+descriptionProperties = ["VALUE", "PART_NAME", "PARTNAME"]
+
+
+#
+# Return the (identifier, original name) of an EDIF name, which is
+# either an identifier or a (rename identifier "original name") element
+#
+def getName(name):
+    if isinstance(name, list):
+        if (name[0] == "rename") and (len(name) > 2) and not isinstance(name[2], list):
+            return (name[1], name[2])
+        if len(name) > 1:
+            return getName(name[1])
+        return (None, None)
+    return (name, name)
+
+
+#
+# Parses and handles a flat netlist in EDIF 2.0.0 format
+#
+#   (edif board ...
+#     (library parts ...
+#       (cell (rename C_1 "SOIC8") ...
+#         (view netlist (viewType NETLIST)
+#           (interface (port (rename &1 "1") ...) ...))))
+#     (library design ...
+#       (cell top ...
+#         (view netlist ...
+#           (contents
+#             (instance U1 (viewRef netlist (cellRef C_1 (libraryRef parts)))
+#               (property (rename PCB_FOOTPRINT "PCB Footprint") (string "SOIC8")))
+#             (net (rename SPI_CLK "SPI CLK")
+#               (joined (portRef &1 (instanceRef U1)) ...)))))))
+#
+# Ports and instances need to be defined before the nets referencing them.
+#
+class EdifNetlist(Netlist):
+    def __init__(self, filename=None, debug=False):
+        Netlist.__init__(self)
+        if not (filename is None):
+            self.parseFile(filename, debug)
+
+    #
+    # Remove all components and nets
+    # and the port and instance names
+    #
+    def clear(self):
+        Netlist.clear(self)
+        # Cell identifier -> {port identifier: pin name}
+        self.portNames = {}
+        # Instance identifier -> (designator, cell identifier)
+        self.instances = {}
+
+    #
+    # Stream through the given file and generate a
+    # list of components and nets
+    #
+    def parseFile(self, filename, debug=False):
+        with debugOutput(debug):
+            with instrumentation.phase("parse"):
+                self.clear()
+                tokens = tokenizeSExpressions(readChunks(filename))
+                for path, element in iterElements(tokens, set(["port", "instance", "net"])):
+                    if element[0] == "port":
+                        self.parsePort(path, element)
+                    elif element[0] == "instance":
+                        self.parseInstance(element)
+                    else:
+                        self.parseNet(element)
+
+            instrumentation.count("components", len(self.components))
+            instrumentation.count("nets", len(self.nets))
+            instrumentation.count("pins", len(self.netsByPin))
+
+    #
+    # Remember the pin name of a (port ...) element of a cell interface
+    #
+    def parsePort(self, path, element):
+        cell = None
+        for head, name in path:
+            if head == "cell":
+                cell = name
+        if (cell is None) or (len(element) < 2):
+            return
+        identifier, name = getName(element[1])
+        if not (identifier is None):
+            self.portNames.setdefault(cell, {})[identifier] = name
+
+    #
+    # Create a component from an (instance ...) element
+    #
+    def parseInstance(self, element):
+        if len(element) < 2:
+            return
+        identifier, designator = getName(element[1])
+        if identifier is None:
+            return
+        designatorElement = findChild(element, "designator")
+        if not ((designatorElement is None) or (len(designatorElement) < 2) or isinstance(designatorElement[1], list)):
+            designator = designatorElement[1]
+
+        cell = None
+        viewRef = findChild(element, "viewref")
+        if not (viewRef is None):
+            cellRef = findChild(viewRef, "cellref")
+            if not ((cellRef is None) or (len(cellRef) < 2)):
+                cell = getName(cellRef[1])[0]
+
+        properties = {}
+        for p in findChildren(element, "property"):
+            if len(p) < 3:
+                continue
+            key = getName(p[1])[1]
+            value = p[2]
+            if isinstance(value, list) and (len(value) > 1):
+                value = value[1]
+            if (key is None) or isinstance(value, list):
+                continue
+            properties.setdefault(key.upper().replace(" ", "_"), value)
+
+        footprint = ""
+        for key in footprintProperties:
+            if key in properties:
+                footprint = properties[key]
+                break
+        description = "" if cell is None else cell
+        for key in descriptionProperties:
+            if key in properties:
+                description = properties[key]
+                break
+
+        self.instances[identifier] = (designator, cell)
+        self.addComponent(Component(designator=designator, description=description, footprint=footprint))
+        logger.debug("%s: %s (%s)", designator, description, footprint)
+
+    #
+    # Return the (designator, pin name) of a (portRef ...) element
+    # or None, if it does not refer to the port of an instance
+    #
+    def getPortReference(self, portRef):
+        instanceRef = findChild(portRef, "instanceref")
+        if (instanceRef is None) or (len(instanceRef) < 2) or (len(portRef) < 2):
+            return None
+        instance = self.instances.get(getName(instanceRef[1])[0])
+        if instance is None:
+            return None
+        designator, cell = instance
+
+        port = portRef[1]
+        if isinstance(port, list) and (port[0] == "member") and (len(port) > 2):
+            # Bit of a bus port
+            identifier = getName(port[1])[0]
+            name = self.portNames.get(cell, {}).get(identifier, identifier)
+            return (designator, "{:s}[{:s}]".format(name, port[2]))
+        identifier = getName(port)[0]
+        if identifier is None:
+            return None
+        return (designator, self.portNames.get(cell, {}).get(identifier, identifier))
+
+    #
+    # Create a net from a (net ...) element
+    #
+    def parseNet(self, element):
+        if len(element) < 2:
+            return
+        netlabel = getName(element[1])[1]
+        if netlabel is None:
+            # Skip nets without label
+            return
+        pins = []
+        joined = findChild(element, "joined")
+        if not (joined is None):
+            for portRef in findChildren(joined, "portref"):
+                pin = self.getPortReference(portRef)
+                if not (pin is None):
+                    pins += [pin]
+        net = self.createNet(netlabel, pins)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%d pin(s) are connected to net '%s': %s", len(net.getPins()), net.getLabel(), str([str(p) for p in net.getPins()]))
@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+#
+# This file detects the format of a netlist file
+# and imports it using the matching Netlist subclass
+#
+
+import re
+
+import edif
+import kicad
+import tango
+import telesis
+from edif import EdifNetlist
+from kicad import KiCadNetlist
+from tango import TangoNetlist
+from telesis import TelesisNetlist
+
+#
+# Format name -> Netlist subclass
+#
+formats = {
+    "tango": TangoNetlist,
+    "kicad": KiCadNetlist,
+    "telesis": TelesisNetlist,
+    "edif": EdifNetlist,
+}
+
+#
+# Format name -> version of the parser (see cache.py)
+#
+parserVersions = {
+    "tango": tango.parserVersion,
+    "kicad": kicad.parserVersion,
+    "telesis": telesis.parserVersion,
+    "edif": edif.parserVersion,
+}
+
+#
+# Number of bytes inspected to detect the format
+#
+headerSize = 4096
+
+#
+# Headers of the S-expression formats, e.g. "(export (version" and "(edif board (edifVersion"
+#
+regex_kicad = re.compile("\\(\\s*export\\s*\\(", re.IGNORECASE)
+regex_edif = re.compile("\\(\\s*edif\\s+[^\\s()]+\\s*\\(", re.IGNORECASE)
+
+
+#
+# Detect the format of a netlist from the beginning of the file
+# and return its name (see formats) or None
+#
+def detectFormat(filename):
+    f = open(filename, "rb")
+    header = f.read(headerSize)
+    f.close()
+    header = header.decode("iso8859_15").lstrip("\xef\xbb\xbf \t\r\n")
+
+    if not (regex_kicad.match(header) is None):
+        return "kicad"
+    if not (regex_edif.match(header) is None):
+        return "edif"
+    if header.startswith("$") or (header.upper().find("$PACKAGES") > -1):
+        return "telesis"
+    if header.startswith("[") or header.startswith("("):
+        return "tango"
+    return None
+
+
+#
+# Import a netlist file in the given format,
+# which is detected automatically when unspecified
+#
+# lazy is passed on to formats supporting lazy loading (Tango).
+#
+def loadNetlist(filename, format=None, debug=False, lazy=False):
+    if format is None:
+        format = detectFormat(filename)
+        if format is None:
+            raise ValueError("Unable to detect the format of netlist {:s}.".format(filename))
+    if not (format in formats):
+        raise ValueError("Unknown netlist format {:s}.".format(format))
+    if format == "tango":
+        return TangoNetlist(filename, debug, lazy)
+    return formats[format](filename, debug)
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    # Test data: The same small board in every supported format
+    contents = {
+        "tango": "[\nU1\nSOIC8\nMCU\n]\n[\nR1\nR0603\n10k\n]\n" \
+                 "(\nVCC\nU1,1\nR1,1\n)\n(\nRESET\nU1,2\nR1,2\n)\n",
+        "kicad": "(export (version \"E\")\n" \
+                 "  (components\n" \
+                 "    (comp (ref \"U1\") (value \"MCU\") (footprint \"SOIC8\"))\n" \
+                 "    (comp (ref \"R1\") (value \"10k\") (footprint \"R0603\")))\n" \
+                 "  (nets\n" \
+                 "    (net (code \"1\") (name \"VCC\")\n" \
+                 "      (node (ref \"U1\") (pin \"1\")) (node (ref \"R1\") (pin \"1\")))\n" \
+                 "    (net (code \"2\") (name \"RESET\")\n" \
+                 "      (node (ref \"U1\") (pin \"2\")) (node (ref \"R1\") (pin \"2\")))))\n",
+        "telesis": "$PACKAGES\n'SOIC8' ! 'MCU' ; U1\n'R0603' ! '10k' ; R1\n" \
+                   "$NETS\n'VCC' ; U1.1 R1.1\n'RESET' ; U1.2 ,\nR1.2\n$END\n",
+        "edif": "(edif board (edifVersion 2 0 0) (edifLevel 0) (keywordMap (keywordLevel 0))\n" \
+                "  (library parts (edifLevel 0) (technology (numberDefinition))\n" \
+                "    (cell C_U1 (cellType GENERIC) (view netlist (viewType NETLIST) (interface\n" \
+                "      (port (rename &1 \"1\") (direction INOUT)) (port (rename &2 \"2\") (direction INOUT)))))\n" \
+                "    (cell C_R1 (cellType GENERIC) (view netlist (viewType NETLIST) (interface\n" \
+                "      (port (rename &1 \"1\") (direction INOUT)) (port (rename &2 \"2\") (direction INOUT))))))\n" \
+                "  (library design (edifLevel 0) (technology (numberDefinition))\n" \
+                "    (cell top (cellType GENERIC) (view netlist (viewType NETLIST) (interface) (contents\n" \
+                "      (instance U1 (viewRef netlist (cellRef C_U1 (libraryRef parts)))\n" \
+                "        (property (rename PCB_FOOTPRINT \"PCB Footprint\") (string \"SOIC8\")) (property Value (string \"MCU\")))\n" \
+                "      (instance R1 (viewRef netlist (cellRef C_R1 (libraryRef parts)))\n" \
+                "        (property (rename PCB_FOOTPRINT \"PCB Footprint\") (string \"R0603\")) (property Value (string \"10k\")))\n" \
+                "      (net VCC (joined (portRef &1 (instanceRef U1)) (portRef &1 (instanceRef R1))))\n" \
+                "      (net RESET (joined (portRef &2 (instanceRef U1)) (portRef &2 (instanceRef R1))))))))\n" \
+                "  (design board (cellRef top (libraryRef design))))\n",
+    }
+
+    #
+    # Return the components and nets of a netlist
+    #
+    def describe(netlist):
+        result = []
+        for designator in ["U1", "R1"]:
+            component = netlist.getComponent(designator)
+            result += [(component.getFootprint(), component.getDescription(), sorted(pin.getName() for pin in component.getPins()))]
+        result += [sorted((net.getLabel(), sorted(str(pin) for pin in net.getPins())) for net in netlist.getNets())]
+        return result
+
+    # Test
+    directory = tempfile.mkdtemp()
+    detected = {}
+    results = {}
+    for format, content in contents.items():
+        filename = os.path.join(directory, "board." + format)
+        f = open(filename, "w")
+        f.write(content)
+        f.close()
+        detected[format] = detectFormat(filename)
+        results[format] = describe(loadNetlist(filename))
+        os.remove(filename)
+    os.rmdir(directory)
+
+    # Test result evaluation
+    for format in contents:
+        if detected[format] != format:
+            print("Test failed: A {:s} netlist was detected as {:s}.".format(format, str(detected[format])))
+            exit(5)
+        if results[format] != results["tango"]:
+            print("Test failed: The {:s} importer returned {:s} instead of {:s}.".format(format, str(results[format]), str(results["tango"])))
+            exit(5)
+    print("Test succeeded: All formats are detected and imported alike.")
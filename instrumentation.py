@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+#
+# This file provides lightweight instrumentation for the conversion pipeline:
+# phase timers, counters and optional CPU and memory profiling,
+# plus the loggers used for diagnostic output
+#
+# Instrumentation is disabled by default, so that the
+# hooks in the hot paths cost next to nothing.
+#
+
+import contextlib
+import cProfile
+import io
+import json
+import logging
+import pstats
+import sys
+import time
+import tracemalloc
+
+#
+# Name of the logger all modules log to (as children)
+#
+loggerName = "netlist2pcf"
+
+
+#
+# Return the logger of a module
+#
+def getLogger(name):
+    return logging.getLogger(loggerName + "." + name)
+
+
+#
+# Make debug messages visible on stdout within a with block,
+# as the debug arguments of the parsing functions request;
+# the previous logging configuration is restored afterwards
+#
+@contextlib.contextmanager
+def debugOutput(enabled=True):
+    if not enabled:
+        yield
+        return
+    logger = logging.getLogger(loggerName)
+    level = logger.level
+    handler = None
+    logger.setLevel(logging.DEBUG)
+    if len(logger.handlers) == 0:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+        if not (handler is None):
+            logger.removeHandler(handler)
+
+
+#
+# Collects phase timings and counters
+#
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.profiler = None
+        self.memory = False
+        self.reset()
+
+    #
+    # Discard all measurements
+    #
+    def reset(self):
+        # Phase name -> {"time": seconds, "calls": count}
+        self.phases = {}
+        # Counter name -> value
+        self.counters = {}
+        self.profile = None
+
+    #
+    # Start collecting, optionally with cProfile and tracemalloc
+    #
+    def enable(self, profile=False, memory=False):
+        self.enabled = True
+        if profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        if memory:
+            self.memory = True
+            tracemalloc.start()
+
+    #
+    # Stop collecting; measurements are kept until reset()
+    #
+    def disable(self):
+        self.enabled = False
+        if not (self.profiler is None):
+            self.profiler.disable()
+            self.profile = self.getProfileStatistics(self.profiler)
+            self.profiler = None
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            self.counters["memory.current"] = current
+            self.counters["memory.peak"] = peak
+            tracemalloc.stop()
+            self.memory = False
+
+    #
+    # Measure the duration of a block, e.g.
+    #   with instrumentation.phase("parse"):
+    #
+    def phase(self, name):
+        if not self.enabled:
+            return noPhase
+        return self.measurePhase(name)
+
+    @contextlib.contextmanager
+    def measurePhase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            phase = self.phases.setdefault(name, {"time": 0.0, "calls": 0})
+            phase["time"] += elapsed
+            phase["calls"] += 1
+
+    #
+    # Increment a counter
+    #
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    #
+    # Return the most expensive functions of a profiler run
+    #
+    def getProfileStatistics(self, profiler, limit=30):
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        stats.sort_stats("cumulative")
+        result = []
+        for function in stats.fcn_list[:limit]:
+            calls, primitiveCalls, totalTime, cumulativeTime, callers = stats.stats[function]
+            result += [{
+                "function": "{:s}:{:d}({:s})".format(function[0], function[1], function[2]),
+                "calls": calls,
+                "time": totalTime,
+                "cumulative": cumulativeTime
+            }]
+        return result
+
+    #
+    # Return all measurements as a JSON-compatible dict
+    #
+    def getReport(self):
+        report = {"phases": self.phases, "counters": self.counters}
+        if not (self.profile is None):
+            report["profile"] = self.profile
+        return report
+
+    def saveReport(self, filename):
+        f = open(filename, "w")
+        json.dump(self.getReport(), f, indent=2)
+        f.close()
+
+
+noPhase = contextlib.nullcontext()
+
+#
+# The instrumentation shared by all modules
+#
+instrumentation = Instrumentation()
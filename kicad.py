@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+
+import logging
+from netlists import *
+from instrumentation import debugOutput, getLogger, instrumentation
+from tokenizer import getValue, findChildren, iterElements, readChunks, tokenizeSExpressions
+
+logger = getLogger("kicad")
+
+#
+# Increment, whenever the parser output changes,
+# in order to invalidate cached netlists
+#
+parserVersion = 1
+
+
+#
+# Parses and handles a netlist in KiCad format (.net, S-expressions)
+#
+#   (export (version "E")
+#     (components
+#       (comp (ref "R1") (value "10k") (footprint "Resistor_SMD:R_0603_1608Metric") ...))
+#     (nets
+#       (net (code "1") (name "GND")
+#         (node (ref "R1") (pin "2")) ...)))
+#
+class KiCadNetlist(Netlist):
+    def __init__(self, filename=None, debug=False):
+        Netlist.__init__(self)
+        if not (filename is None):
+            self.parseFile(filename, debug)
+
+    #
+    # Stream through the given file and generate a
+    # list of components and nets
+    #
+    def parseFile(self, filename, debug=False):
+        with debugOutput(debug):
+            with instrumentation.phase("parse"):
+                self.clear()
+                tokens = tokenizeSExpressions(readChunks(filename, encoding="utf-8"))
+                for path, element in iterElements(tokens, set(["comp", "net"])):
+                    if element[0] == "comp":
+                        self.parseComponent(element)
+                    else:
+                        self.parseNet(element)
+
+            instrumentation.count("components", len(self.components))
+            instrumentation.count("nets", len(self.nets))
+            instrumentation.count("pins", len(self.netsByPin))
+
+    #
+    # Create a component from a (comp ...) element
+    #
+    def parseComponent(self, element):
+        designator = getValue(element, "ref")
+        if designator is None:
+            # Skip components without reference designator
+            return
+        description = getValue(element, "value", "")
+        footprint = getValue(element, "footprint", "")
+        self.addComponent(Component(designator=designator, description=description, footprint=footprint))
+        logger.debug("%s: %s (%s)", designator, description, footprint)
+
+    #
+    # Create a net from a (net ...) element
+    #
+    def parseNet(self, element):
+        netlabel = getValue(element, "name")
+        if netlabel is None:
+            # Skip nets without label
+            return
+        pins = []
+        for node in findChildren(element, "node"):
+            designator = getValue(node, "ref")
+            name = getValue(node, "pin")
+            if (designator is None) or (name is None):
+                # Skip incomplete nodes
+                continue
+            pins += [(designator, name)]
+        net = self.createNet(netlabel, pins)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%d pin(s) are connected to net '%s': %s", len(net.getPins()), net.getLabel(), str([str(p) for p in net.getPins()]))
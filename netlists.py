@@ -1,14 +1,67 @@
 #!/usr/bin/python
 
+import re
+import sys
+from array import array
+
+from instrumentation import debugOutput, getLogger, instrumentation
+
+logger = getLogger("netlists")
+
+#
+# Increment, whenever the layout of FrozenNetlist changes,
+# in order to invalidate cached netlists
+#
+frozenNetlistVersion = 3
+
+
+#
+# Default patterns of power and ground net labels
+# (matched against the whole label, not case-sensitive)
+#
+defaultPowerNetPatterns = [
+    # GND, AGND, DGND, PGND, GND_ISO
+    "[ADP]?GND[A-Z0-9_]*",
+    # VCC, VDD, VDDA, VSS, VCC_3V3, VCC_IO
+    "V(CC|DD|SS|EE)[A-Z]?(_[A-Z0-9_.+-]*)?",
+    "VBAT|VBUS|VIN",
+    # 1V2, 1.2V, 3V3, 3.3V, +3V3, 5V, 12V, -12V
+    "[+-]?[0-9]+(\\.[0-9]+)?V[0-9]*",
+    # HV+, HV-, DC+, DC-
+    "(HV|DC)[+-]",
+]
+
+
+#
+# Classifies net labels as power nets
+# using one combined regular expression
+#
+class PowerNetClassifier:
+    def __init__(self, patterns=None):
+        if patterns is None:
+            patterns = defaultPowerNetPatterns
+        self.patterns = list(patterns)
+        self.regex = re.compile("|".join(["(?:" + p + ")" for p in self.patterns]), re.IGNORECASE)
+
+    def isPower(self, label):
+        if len(self.patterns) == 0:
+            return False
+        return not (self.regex.fullmatch(label.strip()) is None)
+
+
+defaultPowerNetClassifier = PowerNetClassifier()
+
 
 #
 # A pin is one physical connection of a component.
 # It has a name (string) and a reference to it's component (object reference).
 #
 class Pin:
+    __slots__ = ("component", "name")
+
     def __init__(self, component=None, name=""):
         self.component = component
-        self.name = name
+        self.name = sys.intern(str(name))
 
     def getName(self):
         return self.name
@@ -26,13 +79,17 @@ class Pin:
 # maybe also a description (string) and a footprint (string)
 #
 class Component:
+    __slots__ = ("designator", "description", "footprint", "pins", "pinsByName")
+
     def __init__(self, designator="", description="", footprint=""):
-        self.designator = designator.strip()
+        self.designator = sys.intern(designator.strip())
         if self.designator == "*":
             print("Warning: Created component with wildcard designator.")
         self.description = description.strip()
         self.footprint = footprint.strip()
         self.pins = []
+        # Index of pins by name for constant-time lookup
+        self.pinsByName = {}
 
     def getPinByNumber(self, number):
         if len(self.pins) < number:
@@ -40,10 +97,7 @@ class Component:
         return self.pins[number-1]
 
     def getPinByName(self, name):
-        for pin in self.pins:
-            if str(pin.getName()) == str(name):
-                return pin
-        return None
+        return self.pinsByName.get(str(name))
 
     def createPinFromName(self, name):
         # Does a pin with that name already exist?
@@ -51,6 +105,7 @@ class Component:
         if p is None:
             p = Pin(component=self, name=name)
             self.pins += [p]
+            self.pinsByName[str(name)] = p
         return p
 
     def getDesignator(self):
@@ -59,6 +114,9 @@ class Component:
     def getDescription(self):
         return self.description
 
+    def getFootprint(self):
+        return self.footprint
+
     def getPins(self):
         return self.pins
 
@@ -68,19 +126,37 @@ class Component:
 # It has a name i.e. label and a list of pins (object references).
 #
 class Net:
+    __slots__ = ("label", "pins", "pinsByDesignator", "netlist", "power")
+
     def __init__(self, label=""):
-        self.label = label
+        self.label = sys.intern(label)
         self.pins = []
+        # First pin per (upper-cased) component designator
+        self.pinsByDesignator = {}
+        # The netlist this net was added to, if any
+        self.netlist = None
+        # Cached result of isPower()
+        self.power = None
 
     def getLabel(self):
         return self.label
 
     def isPower(self):
-        # TODO: Match regexp to detect power net label
-        return self.label in ["GND", "DGND", "1V2", "1.2V", "3V3", "3.3V", "5V", "12V", "HV+", "HV-", "DC+", "DC-"]
+        if self.power is None:
+            if self.netlist is None:
+                classifier = defaultPowerNetClassifier
+            else:
+                classifier = self.netlist.powerNetClassifier
+            self.power = classifier.isPower(self.label)
+        return self.power
 
     def addPin(self, pin):
         self.pins += [pin]
+        designator = pin.getComponent().getDesignator().upper()
+        if not (designator in self.pinsByDesignator):
+            self.pinsByDesignator[designator] = pin
+        if not (self.netlist is None):
+            self.netlist.indexPin(self, pin)
 
     def getPins(self):
         return self.pins
@@ -92,11 +168,7 @@ class Net:
     def getPin(self, componentDesignator=None):
         if componentDesignator is None:
             return None
-        componentDesignator = componentDesignator.upper().strip()
-        for pin in self.pins:
-            if pin.getComponent().getDesignator().upper() == componentDesignator:
-                return pin
-        return None
+        return self.pinsByDesignator.get(componentDesignator.upper().strip())
 
     def __str__(self):
         return self.getLabel()
@@ -106,7 +178,7 @@ class Net:
 # Convert string for compatibility with regular expressions
 #
 def cleanupEncoding(s):
-    return str(s.encode("ascii", "replace")).replace("\\n", "\n")
+    return s.encode("ascii", "replace").decode("ascii")
 
 
 #
@@ -115,8 +187,220 @@ def cleanupEncoding(s):
 #
 class Netlist:
     def __init__(self):
+        self.powerNetClassifier = defaultPowerNetClassifier
+        self.clear()
+
+    #
+    # Use the given regular expressions to detect power nets
+    #
+    def setPowerNetPatterns(self, patterns):
+        self.powerNetClassifier = PowerNetClassifier(patterns)
+        for net in self.nets:
+            net.power = None
+
+    #
+    # Remove all components and nets
+    # and reset the lookup indexes
+    #
+    def clear(self):
         self.components = []
         self.nets = []
+        # Upper-cased designator -> Component
+        self.componentsByDesignator = {}
+        # Net label -> Net, and upper-cased net label -> Net as fallback
+        self.netsByExactLabel = {}
+        self.netsByLabel = {}
+        # Pin -> Net
+        self.netsByPin = {}
+        # Upper-cased designator -> {Net: first pin of that component on the net}
+        self.netsByDesignator = {}
+        # Source of the components and nets not created yet (see attachSource)
+        self.source = None
+        # Source index -> component/net created from it (None for skipped entries)
+        self.loadedComponents = {}
+        self.loadedNets = {}
+        # Upper-cased designators of the components with all nets loaded
+        self.completeComponents = set()
+
+    #
+    # Create components and nets on demand from the given source
+    # instead of all at once (lazy loading)
+    #
+    # The source provides the lookup tables componentIndex
+    # (upper-cased designator -> index), netLabelIndex (label -> index),
+    # netIndex (upper-cased label -> index) and netsByDesignator (upper-cased designator -> net indexes),
+    # getComponentCount() and getNetCount(), as well as readComponents(indexes)
+    # returning (designator, description, footprint) tuples and readNets(indexes)
+    # returning (label, [(designator, pin name), ...]) tuples, or None for entries to skip.
+    # See FrozenNetlist and tango.TangoBlockIndex.
+    #
+    def attachSource(self, source):
+        self.clear()
+        self.source = source
+
+    #
+    # Create the components with the given source indexes, unless already done
+    #
+    def loadComponents(self, indexes):
+        indexes = sorted(set([i for i in indexes if not (i in self.loadedComponents)]))
+        if len(indexes) == 0:
+            return
+        for i, entry in zip(indexes, self.source.readComponents(indexes)):
+            component = None
+            if not (entry is None):
+                component = Component(designator=entry[0], description=entry[1], footprint=entry[2])
+                self.addComponent(component)
+            self.loadedComponents[i] = component
+        instrumentation.count("components", len(indexes))
+
+    #
+    # Create the nets with the given source indexes (and their pins), unless already done
+    #
+    def loadNets(self, indexes):
+        indexes = sorted(set([i for i in indexes if not (i in self.loadedNets)]))
+        if len(indexes) == 0:
+            return
+        entries = self.source.readNets(indexes)
+
+        # Create the referenced components in one go
+        designators = set()
+        for entry in entries:
+            if not (entry is None):
+                for designator, name in entry[1]:
+                    designators.add(designator.upper().strip())
+        componentIndex = self.source.componentIndex
+        self.loadComponents([componentIndex[d] for d in designators if d in componentIndex])
+
+        for i, entry in zip(indexes, entries):
+            self.loadedNets[i] = None if entry is None else self.createNet(entry[0], entry[1])
+        instrumentation.count("nets", len(indexes))
+
+    #
+    # Create all nets of the given component (upper-cased designator),
+    # so that its pins are complete
+    #
+    def loadComponentNets(self, designator):
+        if designator in self.completeComponents:
+            return
+        indexes = sorted(self.source.netsByDesignator.get(designator, []))
+        self.loadNets(indexes)
+        self.completeComponents.add(designator)
+        nets = [self.loadedNets[i] for i in indexes]
+        component = self.componentsByDesignator.get(designator)
+        if not (component is None):
+            self.sortPins([component], nets)
+
+        # List the nets in source order, even if some were loaded before
+        connected = self.netsByDesignator.get(designator)
+        if not (connected is None):
+            ordered = {}
+            for net in nets + list(connected.keys()):
+                if (net in connected) and not (net in ordered):
+                    ordered[net] = connected[net]
+            self.netsByDesignator[designator] = ordered
+
+    #
+    # Order the pins of the given components like a full load would,
+    # i.e. by their first appearance in the given nets (in source order),
+    # even if the nets were loaded in a different order
+    #
+    def sortPins(self, components, nets):
+        components = set(components)
+        order = {}
+        for net in nets:
+            if net is None:
+                continue
+            for pin in net.getPins():
+                if (pin.getComponent() in components) and not (pin in order):
+                    order[pin] = len(order)
+        for component in components:
+            component.pins.sort(key=lambda pin: order.get(pin, len(order)))
+
+    #
+    # Create all components and nets not loaded yet,
+    # keeping the order of the source
+    #
+    def loadAll(self):
+        if self.source is None:
+            return
+        self.loadComponents(range(self.source.getComponentCount()))
+        self.loadNets(range(self.source.getNetCount()))
+        loaded = set(self.loadedComponents.values())
+        self.components = [self.loadedComponents[i] for i in sorted(self.loadedComponents) if not (self.loadedComponents[i] is None)] + [c for c in self.components if not (c in loaded)]
+        loaded = set(self.loadedNets.values())
+        self.nets = [self.loadedNets[i] for i in sorted(self.loadedNets) if not (self.loadedNets[i] is None)] + [n for n in self.nets if not (n in loaded)]
+        incomplete = [c for c in self.components if not (c.getDesignator().upper() in self.completeComponents)]
+        self.sortPins(incomplete, self.nets)
+        self.source = None
+
+        # Rebuild the lookup indexes in source order,
+        # so that the first of duplicate entries wins like in a full load
+        self.componentsByDesignator = {}
+        self.netsByExactLabel = {}
+        self.netsByLabel = {}
+        self.netsByPin = {}
+        self.netsByDesignator = {}
+        for component in self.components:
+            self.indexComponent(component)
+        for net in self.nets:
+            self.indexNet(net)
+
+    #
+    # Add a component to this netlist
+    #
+    def addComponent(self, component):
+        self.components += [component]
+        self.indexComponent(component)
+
+    def indexComponent(self, component):
+        designator = component.getDesignator().upper()
+        if not (designator in self.componentsByDesignator):
+            self.componentsByDesignator[designator] = component
+
+    #
+    # Add a net to this netlist;
+    # pins added to the net later on are indexed as well
+    #
+    def addNet(self, net):
+        self.nets += [net]
+        self.indexNet(net)
+
+    def indexNet(self, net):
+        self.netsByExactLabel.setdefault(net.getLabel(), net)
+        label = net.getLabel().upper()
+        if not (label in self.netsByLabel):
+            self.netsByLabel[label] = net
+        net.netlist = self
+        net.power = None
+        for pin in net.getPins():
+            self.indexPin(net, pin)
+
+    #
+    # Create a net from a list of (designator, pin name) tuples
+    # and add it to this netlist; pins of unknown components are skipped
+    #
+    def createNet(self, label, pins):
+        net = Net(label=label)
+        for designator, name in pins:
+            component = self.componentsByDesignator.get(designator.upper().strip())
+            if component is None:
+                print("Error: Net '{:s}' references unknown component '{:s}'. Skipping.".format(label, designator))
+                continue
+            net.addPin(component.createPinFromName(name))
+        self.addNet(net)
+        return net
+
+    #
+    # Update the pin lookup indexes
+    # (called by Net.addPin)
+    #
+    def indexPin(self, net, pin):
+        if not (pin in self.netsByPin):
+            self.netsByPin[pin] = net
+        designator = pin.getComponent().getDesignator().upper()
+        nets = self.netsByDesignator.setdefault(designator, {})
+        if not (net in nets):
+            nets[net] = pin
 
     #
     # Only reads the text from a file.
@@ -124,32 +408,46 @@ class Netlist:
     # to take care of parsing afterwards.
     #
     def readFromFile(self, filename):
-        f = open(filename, "r", encoding="iso8859_15")
-        # f = open(filename, "r")
-        self.text = cleanupEncoding(f.read())
-        # print(self.text)
-        f.close()
+        with instrumentation.phase("read"):
+            f = open(filename, "r", encoding="iso8859_15")
+            self.text = cleanupEncoding(f.read())
+            f.close()
 
     #
     # Return all components in this netlist
     #
     def getComponents(self):
+        self.loadAll()
         return self.components
 
     #
     # Return all nets in this netlist
     #
     def getNets(self):
+        self.loadAll()
         return self.nets
 
     #
     # Returns the net with the given label if present, else None
     #
+    # A net with exactly that label is preferred over
+    # one, whose label only differs in case.
+    #
     def getNet(self, netlabel):
-        for net in self.getNets():
-            if net.getLabel() == netlabel:
-                return net
-        return None
+        instrumentation.count("lookups.net")
+        if not (self.source is None):
+            # Duplicate labels: The first net in the source wins
+            i = self.source.netLabelIndex.get(netlabel)
+            if i is None:
+                i = self.source.netIndex.get(netlabel.upper())
+            if not (i is None):
+                self.loadNets([i])
+                if not (self.loadedNets[i] is None):
+                    return self.loadedNets[i]
+        net = self.netsByExactLabel.get(netlabel)
+        if net is None:
+            net = self.netsByLabel.get(netlabel.upper())
+        return net
 
     #
     # Returns true, if the given net is present in this netlist
@@ -161,19 +459,26 @@ class Netlist:
     # Return the component with the given designator (not case-sensitive)
     #
     def getComponentByDesignator(self, designator):
+        instrumentation.count("lookups.component")
         designator = designator.upper().strip()
-        for component in self.components:
-            if component.getDesignator().upper() == designator:
-                return component
-        print("Error: Component not found: " + designator)
-        return None
+        if not ((self.source is None) or (self.source.componentIndex.get(designator) is None)):
+            # Create the component along with all of its pins
+            i = self.source.componentIndex[designator]
+            self.loadComponents([i])
+            self.loadComponentNets(designator)
+            if not (self.loadedComponents[i] is None):
+                return self.loadedComponents[i]
+        component = self.componentsByDesignator.get(designator)
+        if component is None:
+            print("Error: Component not found: " + designator)
+        return component
 
     #
     # Return the component with the given description (not case-sensitive)
     #
     def getComponentByDescription(self, description):
         description = description.upper().strip()
-        for component in self.components:
+        for component in self.getComponents():
             if component.getDescription().upper() == description:
                 return component
         print("Error: Component not found: " + description)
@@ -205,23 +510,31 @@ class Netlist:
             return self.getComponentByKeyword(keyword)
         return None
 
+    #
+    # Return the nets the component with the given designator is connected to
+    # as dict Net -> first pin of the component on that net
+    #
+    def getComponentNets(self, designator):
+        designator = designator.upper().strip()
+        if not (self.source is None):
+            self.loadComponentNets(designator)
+        return self.netsByDesignator.get(designator, {})
+
     #
     # Returns the net (object reference) of the given pin (object reference)
     #
     def getNetOnPin(self, pin, debug=False):
-        if pin is None:
-            if debug:
-                print("Error: Illegal argument None given to getNetOnPin().")
+        with debugOutput(debug):
+            instrumentation.count("lookups.netOnPin")
+            if pin is None:
+                logger.debug("Error: Illegal argument None given to getNetOnPin().")
+                return None
+            net = self.netsByPin.get(pin)
+            if not (net is None):
+                logger.debug("Found net %s for component %s, pin %s.", net.getLabel(), pin.getComponent().getDesignator(), pin.getName())
+                return net
+            logger.debug("Error: Unable to detect the net connected to component %s, pin %s.", pin.getComponent().getDesignator(), pin.getName())
             return None
-        for net in self.getNets():
-            for p in net.getPins():
-                if p == pin:
-                    if debug:
-                        print("Found net {:s} for component {:s}, pin {:s}.".format(net.getLabel(), p.getComponent().getDesignator(), p.getName()))
-                    return net
-        if debug:
-            print("Error: Unable to detect the net connected to component {:s}, pin {:s}.".format(pin.getComponent().getDesignator(), pin.getName()))
-        return None
 
     #
     # Extract all connections between two components (except power pins)
@@ -229,16 +542,26 @@ class Netlist:
     # returns a list of Net objects
     #
     def elaborateComponentConnections(self, designator1, designator2, debug=False):
+        with debugOutput(debug):
+            with instrumentation.phase("elaborate"):
+                if not (self.source is None):
+                    # Only the nets both components are connected to are needed
+                    nets1 = self.source.netsByDesignator.get(designator1.upper().strip(), [])
+                    nets2 = set(self.source.netsByDesignator.get(designator2.upper().strip(), []))
+                    self.loadNets([i for i in nets1 if i in nets2])
+                return self.findComponentConnections(designator1, designator2)
+
+    #
+    # Implementation of the above, without instrumentation
+    #
+    def findComponentConnections(self, designator1, designator2):
         #
-        # Iterate over all netlist nets and extract the ones with pins matching the given designators
+        # Iterate over the nets of the first component and extract the ones
+        # which the second component is connected to as well
         #
         connectedNets = []
-        for net in self.getNets():
-            pin1 = net.getPin(componentDesignator=designator1)
-            if pin1 is None:
-                # Component 1 is not connected to this net
-                continue
-
+        nets = self.netsByDesignator.get(designator1.upper().strip(), {})
+        for net, pin1 in nets.items():
             pin2 = net.getPin(componentDesignator=designator2)
             if pin2 is None:
                 # Component 2 is not connected to this net
@@ -246,24 +569,275 @@ class Netlist:
 
             if net.isPower():
                 # Disregard non-signal net
-                print("Info: Net {:s} is a power net. Skipping.".format(net.getLabel()))
+                logger.info("Net %s is a power net. Skipping.", net.getLabel())
                 continue
 
             if len(net.getPins()) < 2:
                 # Disregard unconnected nets
-                print("Info: Net {:s} is not connected anywhere. Skipping.".format(net.getLabel()))
+                logger.info("Net %s is not connected anywhere. Skipping.", net.getLabel())
                 continue
 
-            if debug:
-                print("Component {:s} pin {:s} is connected to component {:s} pin {:s} on net {:s}." \
-                      .format(
-                          designator1,
-                          pin1.getName(),
-                          designator2,
-                          pin2.getName(),
-                          net.getLabel()
-                          )
-                      )
+            logger.debug("Component %s pin %s is connected to component %s pin %s on net %s.",
+                         designator1,
+                         pin1.getName(),
+                         designator2,
+                         pin2.getName(),
+                         net.getLabel()
+                         )
             connectedNets += [(net, pin1, pin2)]
 
         return connectedNets
+
+    #
+    # Extract the connections between all pairs of components at once
+    # (except power nets and unconnected nets)
+    # and return them as a ConnectionMatrix
+    #
+    def elaborateAllConnections(self):
+        with instrumentation.phase("index"):
+            return ConnectionMatrix(self)
+
+
+#
+# Return a comparable signature of every component: upper-cased designator -> (footprint, description)
+#
+def getComponentSignatures(netlist):
+    signatures = {}
+    for component in netlist.getComponents():
+        signatures.setdefault(component.getDesignator().upper(), (component.getFootprint(), component.getDescription()))
+    return signatures
+
+
+#
+# Return a comparable signature of every net: upper-cased label -> sorted (designator, pin name) tuples
+# per net with that label (labels may be used more than once)
+#
+def getNetSignatures(netlist):
+    signatures = {}
+    for net in netlist.getNets():
+        pins = sorted([(pin.getComponent().getDesignator().upper(), pin.getName()) for pin in net.getPins()])
+        label = net.getLabel().upper()
+        signatures[label] = signatures.get(label, ()) + (tuple(pins),)
+    return signatures
+
+
+#
+# Return the sets of added, removed and changed keys between two signature dicts
+#
+def diffSignatures(old, new):
+    added = set([key for key in new.keys() if not (key in old)])
+    removed = set([key for key in old.keys() if not (key in new)])
+    changed = set([key for key in old.keys() if (key in new) and (old[key] != new[key])])
+    return (added, removed, changed)
+
+
+#
+# Compare two netlists block by block and return the
+# added, removed and changed components and nets
+# as {"components": (added, removed, changed), "nets": (added, removed, changed)}
+# with upper-cased designators and net labels
+#
+def diffNetlists(old, new):
+    return {
+        "components": diffSignatures(getComponentSignatures(old), getComponentSignatures(new)),
+        "nets": diffSignatures(getNetSignatures(old), getNetSignatures(new))
+    }
+
+
+#
+# Sparse component x net incidence matrix of a netlist
+#
+# Only signal nets (no power nets, at least two pins) are included.
+# The connections of all component pairs are computed in one pass
+# and can be queried by pair afterwards.
+#
+class ConnectionMatrix:
+    def __init__(self, netlist):
+        # Upper-cased designator -> component ID
+        self.componentIds = {}
+        self.designators = []
+        for component in netlist.getComponents():
+            designator = component.getDesignator().upper()
+            if not (designator in self.componentIds):
+                self.componentIds[designator] = len(self.designators)
+                self.designators += [designator]
+
+        # Incidence in CSR layout: The components on net i are
+        # netComponents[netOffsets[i]:netOffsets[i+1]]
+        self.nets = []
+        self.netOffsets = array("l", [0])
+        self.netComponents = array("l")
+        for net in netlist.getNets():
+            if net.isPower() or (len(net.getPins()) < 2):
+                continue
+            ids = set()
+            for designator in net.pinsByDesignator:
+                if designator in self.componentIds:
+                    ids.add(self.componentIds[designator])
+            if len(ids) < 2:
+                continue
+            self.nets += [net]
+            self.netComponents.extend(sorted(ids))
+            self.netOffsets.append(len(self.netComponents))
+
+        # (component ID 1, component ID 2) with ID 1 < ID 2 -> net indexes
+        self.pairs = {}
+        for i in range(len(self.nets)):
+            ids = self.netComponents[self.netOffsets[i]:self.netOffsets[i+1]]
+            for a in range(len(ids)):
+                for b in range(a+1, len(ids)):
+                    key = (ids[a], ids[b])
+                    if not (key in self.pairs):
+                        self.pairs[key] = array("l")
+                    self.pairs[key].append(i)
+
+    #
+    # Return all pairs of connected components
+    # as (designator 1, designator 2) tuples
+    #
+    def getConnectedPairs(self):
+        return [(self.designators[a], self.designators[b]) for (a, b) in self.pairs.keys()]
+
+    #
+    # Return the connections between two components,
+    # like Netlist.elaborateComponentConnections() does,
+    # as a list of (net, pin1, pin2) tuples
+    #
+    def getConnections(self, designator1, designator2):
+        designator1 = designator1.upper().strip()
+        designator2 = designator2.upper().strip()
+        a = self.componentIds.get(designator1)
+        b = self.componentIds.get(designator2)
+        if (a is None) or (b is None):
+            return []
+        key = (a, b) if a < b else (b, a)
+        connectedNets = []
+        for i in self.pairs.get(key, []):
+            net = self.nets[i]
+            connectedNets += [(net, net.getPin(designator1), net.getPin(designator2))]
+        return connectedNets
+
+
+#
+# Read-only, compact copy of a netlist
+#
+# Components, nets and pins are stored as integer IDs
+# in parallel arrays instead of one object per pin.
+# Pins of net i are pinComponent[netOffsets[i]:netOffsets[i+1]]
+# and pinName[netOffsets[i]:netOffsets[i+1]].
+#
+class FrozenNetlist:
+    def __init__(self, netlist):
+        # Shared string tables
+        self.designators = []
+        self.descriptions = []
+        self.footprints = []
+        self.labels = []
+        self.names = []
+        componentIds = {}
+        nameIds = {}
+
+        for component in netlist.getComponents():
+            componentIds[component] = len(self.designators)
+            self.designators += [component.getDesignator()]
+            self.descriptions += [component.getDescription()]
+            self.footprints += [component.getFootprint()]
+
+        self.netOffsets = array("l", [0])
+        self.pinComponent = array("l")
+        self.pinName = array("l")
+        for net in netlist.getNets():
+            self.labels += [net.getLabel()]
+            for pin in net.getPins():
+                name = pin.getName()
+                if not (name in nameIds):
+                    nameIds[name] = len(self.names)
+                    self.names += [name]
+                self.pinComponent.append(componentIds[pin.getComponent()])
+                self.pinName.append(nameIds[name])
+            self.netOffsets.append(len(self.pinComponent))
+
+        # Upper-cased designator/label -> ID, label -> ID
+        self.componentIndex = {}
+        for i, designator in enumerate(self.designators):
+            self.componentIndex.setdefault(designator.upper(), i)
+        self.netIndex = {}
+        self.netLabelIndex = {}
+        for i, label in enumerate(self.labels):
+            self.netIndex.setdefault(label.upper(), i)
+            self.netLabelIndex.setdefault(label, i)
+        # Upper-cased designator -> IDs of the nets it is connected to
+        self.netsByDesignator = {}
+        for i in range(len(self.labels)):
+            ids = set(self.pinComponent[self.netOffsets[i]:self.netOffsets[i+1]])
+            for designator in set([self.designators[c].upper() for c in ids]):
+                nets = self.netsByDesignator.get(designator)
+                if nets is None:
+                    nets = self.netsByDesignator[designator] = array("l")
+                nets.append(i)
+
+    def getComponentCount(self):
+        return len(self.designators)
+
+    def getNetCount(self):
+        return len(self.labels)
+
+    #
+    # Return the components with the given IDs
+    # as (designator, description, footprint) tuples
+    #
+    def readComponents(self, indexes):
+        return [(self.designators[i], self.descriptions[i], self.footprints[i]) for i in indexes]
+
+    #
+    # Return the nets with the given IDs
+    # as (label, [(designator, pin name), ...]) tuples
+    #
+    def readNets(self, indexes):
+        result = []
+        for i in indexes:
+            pins = []
+            for j in range(self.netOffsets[i], self.netOffsets[i+1]):
+                pins += [(self.designators[self.pinComponent[j]], self.names[self.pinName[j]])]
+            result += [(self.labels[i], pins)]
+        return result
+
+    #
+    # Return the labels of all nets
+    #
+    def getNetLabels(self):
+        return self.labels
+
+    #
+    # Returns true, if the given net is present in this netlist
+    #
+    def hasNet(self, netlabel):
+        return netlabel.upper() in self.netIndex
+
+    #
+    # Return the pins of the net with the given label
+    # as a list of (designator, pin name) tuples
+    #
+    def getNetPins(self, netlabel):
+        i = self.netLabelIndex.get(netlabel)
+        if i is None:
+            i = self.netIndex.get(netlabel.upper())
+        if i is None:
+            return []
+        result = []
+        for j in range(self.netOffsets[i], self.netOffsets[i+1]):
+            result += [(self.designators[self.pinComponent[j]], self.names[self.pinName[j]])]
+        return result
+
+    #
+    # Convert back into a regular, mutable netlist
+    # (optionally filling the given, empty netlist object)
+    #
+    # Components and nets are created on demand, when they are queried,
+    # so that thawing itself takes next to no time.
+    #
+    def thaw(self, netlist=None):
+        if netlist is None:
+            netlist = Netlist()
+        netlist.attachSource(self)
+        return netlist
@@ -5,13 +5,26 @@
 # as it is used in Lattice FPGA projects
 #
 
+import os
 
-def cmpPin(a, b):
-    return cmp(a[0], b[0])
+from instrumentation import instrumentation
 
 
-def cmpSignal(a, b):
-    return cmp(a[1], b[1])
+#
+# Create a new, empty file next to the given one for writing
+# and return its file descriptor and name
+#
+# Unlike tempfile.mkstemp(), which restricts the permissions to the owner,
+# the file is created like open() does: The kernel applies the umask to 0o666.
+#
+def createTemporaryFile(filename):
+    directory = os.path.dirname(os.path.abspath(filename))
+    while True:
+        tmp = os.path.join(directory, "{:s}.{:s}.tmp".format(os.path.basename(filename), os.urandom(4).hex()))
+        try:
+            return (os.open(tmp, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666), tmp)
+        except FileExistsError:
+            continue
 
 
 #
@@ -20,37 +33,124 @@ def cmpSignal(a, b):
 #
 class PCF:
     def __init__(self):
-        self.constraints = []
+        # Signal -> pin, in insertion (or sorting) order
+        self.pinsBySignal = {}
+        # Pin -> signal
+        self.signalsByPin = {}
+        # Rejected (signal, pin) assignments
+        self.conflicts = []
 
+    #
+    # Assign a signal to a pin
+    #
+    # Returns False and records the conflict,
+    # if the signal or the pin is already assigned otherwise.
+    #
     def addConstraint(self, signal, pin):
-        self.constraints += [[pin, signal]]
+        if self.pinsBySignal.get(signal) == pin:
+            # Duplicate of an existing constraint
+            return True
+        if signal in self.pinsBySignal:
+            print("Error: Signal {:s} is already assigned to pin {:s}. Not assigning it to pin {:s}.".format(signal, self.pinsBySignal[signal], pin))
+            self.conflicts += [(signal, pin)]
+            return False
+        if pin in self.signalsByPin:
+            print("Error: Pin {:s} is already assigned to signal {:s}. Not assigning it to signal {:s}.".format(pin, self.signalsByPin[pin], signal))
+            self.conflicts += [(signal, pin)]
+            return False
+        self.pinsBySignal[signal] = pin
+        self.signalsByPin[pin] = signal
+        return True
+
+    #
+    # Remove the constraint of the given signal
+    #
+    def removeSignal(self, signal):
+        pin = self.pinsBySignal.pop(signal, None)
+        if not (pin is None):
+            del self.signalsByPin[pin]
+
+    #
+    # Return all constraints as a list of [pin, signal] pairs
+    #
+    def getConstraints(self):
+        return [[pin, signal] for signal, pin in self.pinsBySignal.items()]
+
+    #
+    # Return the rejected (signal, pin) assignments
+    #
+    def getConflicts(self):
+        return self.conflicts
+
+    #
+    # Forget the recorded conflicts
+    #
+    def clearConflicts(self):
+        self.conflicts = []
 
     def sortBySignal(self):
-        self.constraints = sorted(self.constraints, key = lambda c: c[1])
+        self.pinsBySignal = dict(sorted(self.pinsBySignal.items(), key = lambda c: c[0]))
 
     def sortByPin(self):
-        self.constraints = sorted(self.constraints, key = lambda c: c[0])
+        self.pinsBySignal = dict(sorted(self.pinsBySignal.items(), key = lambda c: c[1]))
 
     def hasSignal(self, signal):
-        for constraint in self.constraints:
-            if constraint[1] == signal:
-                return True
-        return False
+        return signal in self.pinsBySignal
 
     def hasPin(self, pin):
-        for constraint in self.constraints:
-            if constraint[0] == pin:
-                return True
-        return False
+        return pin in self.signalsByPin
+
+    def getPin(self, signal):
+        return self.pinsBySignal.get(signal)
+
+    def getSignal(self, pin):
+        return self.signalsByPin.get(pin)
+
+    #
+    # Generate the lines of the constraints file one by one
+    #
+    def iterLines(self):
+        yield "\n"
+        for signal, pin in self.pinsBySignal.items():
+            yield "set_io {:s} {:s}\n".format(signal, pin)
+        yield "\n"
+
+    #
+    # Write the constraints to an open file object
+    #
+    def write(self, f):
+        f.writelines(self.iterLines())
 
     def __str__(self):
-        result = "\n"
-        for c in self.constraints:
-            result += "set_io {:s} {:s}\n".format(c[1], c[0])
-        result += "\n"
-        return result
+        return "".join(self.iterLines())
 
     def saveToFile(self, filename):
-        f = open(filename, "w")
-        f.write(str(self))
-        f.close()
+        with instrumentation.phase("write"):
+            self.writeFile(filename)
+        instrumentation.count("constraints", len(self.pinsBySignal))
+
+    #
+    # Write the constraints to a temporary file next to the target
+    # and rename it afterwards, so that the target is never incomplete
+    #
+    def writeFile(self, filename):
+        fd, tmp = createTemporaryFile(filename)
+        try:
+            f = os.fdopen(fd, "w")
+        except BaseException:
+            os.close(fd)
+            os.remove(tmp)
+            raise
+        try:
+            # The file is closed before it is renamed or removed
+            with f:
+                self.write(f)
+            try:
+                # Keep the permissions of an existing file
+                os.chmod(tmp, os.stat(filename).st_mode & 0o777)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp, filename)
+        except BaseException:
+            os.remove(tmp)
+            raise
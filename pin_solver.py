@@ -0,0 +1,208 @@
+#!/usr/bin/python3
+#
+# This file assigns peripheral signals (e.g. SPI1_SCK) to MCU pins
+#
+# Every pin of the MCU is represented by one bit, every requested signal
+# by the bitmask of the pins it can be configured on. A backtracking search
+# then picks one pin per signal, always continuing with the signal
+# which has the fewest free candidate pins left.
+#
+# Optionally, the candidates are restricted to the MCU pins
+# which the board netlist routes to the FPGA, so that the result
+# can directly be turned into pin constraints for the FPGA.
+#
+
+import argparse
+import sys
+
+from cubemx_ioc import IOC
+from cubemx_xml import CubeXML
+from instrumentation import instrumentation
+from formats import loadNetlist
+from pcf import PCF
+
+
+#
+# Return the MCU pins connected to the FPGA as dict
+# MCU pin name (e.g. PA4) -> (net label, FPGA pin name)
+#
+def getRoutedPins(netlist, mcu, fpga, mcuXml):
+    routedPins = {}
+    for net, mcuPin, fpgaPin in netlist.elaborateComponentConnections(mcu, fpga):
+        pinName = mcuXml.getPinName(mcuPin.getName())
+        if not (pinName is None):
+            routedPins.setdefault(pinName, (net.getLabel(), fpgaPin.getName()))
+    return routedPins
+
+
+#
+# Return the number of bits set in a mask
+#
+def countBits(mask):
+    return bin(mask).count("1")
+
+
+#
+# Assigns signals to the pins of one MCU without conflicts
+#
+class PinSolver:
+    #
+    # reserved optionally lists pin names, which must not be used (e.g. already configured pins),
+    # allowed optionally lists the only pin names, which may be used (e.g. routed pins)
+    #
+    def __init__(self, mcuXml, reserved=None, allowed=None):
+        self.mcuXml = mcuXml
+        # Bit number -> pin name and vice versa
+        self.pinNames = []
+        self.pinBits = {}
+        for name, position, pinType, signals in mcuXml.getPinTable():
+            if not (name in self.pinBits):
+                self.pinBits[name] = len(self.pinNames)
+                self.pinNames += [name]
+
+        self.availableMask = (1 << len(self.pinNames)) - 1
+        if not (allowed is None):
+            self.availableMask = self.getMask(allowed)
+        if not (reserved is None):
+            self.availableMask &= ~self.getMask(reserved)
+
+    #
+    # Return the bitmask of the given pin names (unknown names are ignored)
+    #
+    def getMask(self, pinNames):
+        mask = 0
+        for name in pinNames:
+            bit = self.pinBits.get(name)
+            if not (bit is None):
+                mask |= 1 << bit
+        return mask
+
+    #
+    # Return the bitmask of the available pins, which can be configured for the given signal
+    #
+    def getCandidateMask(self, signal):
+        return self.getMask(self.mcuXml.getCandidatePins(signal)) & self.availableMask
+
+    #
+    # Return the pin names of a bitmask
+    #
+    def getPinNames(self, mask):
+        names = []
+        while mask:
+            bit = mask & -mask
+            names += [self.pinNames[bit.bit_length() - 1]]
+            mask ^= bit
+        return names
+
+    #
+    # Assign every one of the given signals to a different pin.
+    # Returns a dict signal -> pin name, or None if no assignment exists
+    # (or none was found within maxSteps search steps).
+    #
+    def solve(self, signals, maxSteps=1000000):
+        signals = list(dict.fromkeys(signals))
+        candidates = {}
+        for signal in signals:
+            candidates[signal] = self.getCandidateMask(signal)
+            if candidates[signal] == 0:
+                print("Error: No available pin can be configured for {:s}.".format(signal))
+                return None
+
+        self.steps = 0
+        self.maxSteps = maxSteps
+        with instrumentation.phase("solve"):
+            assignment = self.search(candidates, {}, 0)
+        instrumentation.count("solver.steps", self.steps)
+        if (assignment is None) and (self.steps >= maxSteps):
+            print("Warning: No pin assignment found within {:d} steps.".format(maxSteps))
+        return assignment
+
+    #
+    # Recursively assign the remaining signals given the mask of the used pins
+    #
+    def search(self, candidates, assignment, usedMask):
+        if len(assignment) == len(candidates):
+            return dict(assignment)
+        self.steps += 1
+        if self.steps >= self.maxSteps:
+            return None
+
+        # Continue with the most constrained signal
+        signal = None
+        signalMask = 0
+        signalCount = None
+        for s, mask in candidates.items():
+            if s in assignment:
+                continue
+            mask &= ~usedMask
+            count = countBits(mask)
+            if count == 0:
+                # Dead end
+                return None
+            if (signalCount is None) or (count < signalCount):
+                signal, signalMask, signalCount = s, mask, count
+                if count == 1:
+                    break
+
+        while signalMask:
+            bit = signalMask & -signalMask
+            signalMask ^= bit
+            assignment[signal] = self.pinNames[bit.bit_length() - 1]
+            result = self.search(candidates, assignment, usedMask | bit)
+            if not (result is None):
+                return result
+            del assignment[signal]
+            if self.steps >= self.maxSteps:
+                return None
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assign peripheral signals to MCU pins without conflicts.")
+    parser.add_argument("mcuxml", help="STM32CubeMX device description of the MCU")
+    parser.add_argument("signal", nargs="+", help="signals to assign, e.g. SPI1_SCK SPI1_MOSI")
+    parser.add_argument("--ioc", default=None, help="STM32CubeMX project; pins configured there are not used")
+    parser.add_argument("--netlist", default=None, help="board netlist; only use MCU pins routed to the FPGA")
+    parser.add_argument("--mcu", default=None, help="designator of the MCU in the netlist")
+    parser.add_argument("--fpga", default=None, help="designator of the FPGA in the netlist")
+    parser.add_argument("--pcf", default=None, help="write the FPGA pin constraints of the assigned signals to this file")
+    parser.add_argument("--max-steps", type=int, default=1000000, help="give up after this many search steps")
+    args = parser.parse_args()
+
+    mcuXml = CubeXML(args.mcuxml)
+
+    reserved = None
+    if not (args.ioc is None):
+        reserved = IOC(args.ioc).getConfiguredPins()
+
+    routedPins = None
+    if not (args.netlist is None):
+        if (args.mcu is None) or (args.fpga is None):
+            print("Error: --netlist requires --mcu and --fpga.")
+            sys.exit(2)
+        routedPins = getRoutedPins(loadNetlist(args.netlist, lazy=True), args.mcu, args.fpga, mcuXml)
+    elif not (args.pcf is None):
+        print("Error: --pcf requires --netlist.")
+        sys.exit(2)
+
+    solver = PinSolver(mcuXml, reserved, None if routedPins is None else routedPins.keys())
+    assignment = solver.solve(args.signal, args.max_steps)
+    if assignment is None:
+        print("Error: Unable to assign all signals.")
+        sys.exit(1)
+
+    pcf = PCF()
+    for signal in args.signal:
+        pinName = assignment.get(signal)
+        if pinName is None:
+            continue
+        if routedPins is None:
+            print("{:s} {:s}".format(signal, pinName))
+        else:
+            label, fpgaPin = routedPins[pinName]
+            print("{:s} {:s} (net {:s}, FPGA pin {:s})".format(signal, pinName, label, fpgaPin))
+            pcf.addConstraint(signal, fpgaPin)
+
+    if not (args.pcf is None):
+        pcf.sortBySignal()
+        pcf.saveToFile(args.pcf)
@@ -1,6 +1,76 @@
 #!/usr/bin/python3
 
-import sys
+import csv
+
+#
+# Number of characters used to detect the delimiter
+#
+sniffSize = 16 * 1024
+
+
+#
+# Detect the delimiter from the beginning of a CSV file
+#
+def detectDelimiter(sample):
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=";,\t").delimiter
+    except csv.Error:
+        pass
+
+    # The sniffer is not sure, e.g. if there is just one line.
+    # Fall back to the first delimiter found at all.
+    for delimiter in [";", ",", "\t"]:
+        if sample.find(delimiter) > -1:
+            return delimiter
+    raise ValueError("Failed to detect delimiter. Unable to import CSV.")
+
+
+#
+# Generate the rows of a CSV file one by one, as lists of columns
+#
+# When unspecified, the delimiter is detected automatically
+# from the first few kilobytes of the file.
+# Compatible with Linux, Windows and Mac linebreaks.
+# Empty lines are skipped.
+#
+# types optionally lists a conversion function per column, e.g. [str, int];
+# None leaves a column unchanged. With hasHeader=True,
+# the first row is not converted.
+#
+def iterCSV(filename, delimiter=None, types=None, hasHeader=False):
+    f = open(filename, "r", newline="")
+    try:
+        if delimiter is None:
+            delimiter = detectDelimiter(f.read(sniffSize))
+            f.seek(0)
+
+        reader = csv.reader(f, delimiter=delimiter)
+        for row in reader:
+            if len(row) == 0:
+                continue
+            if hasHeader:
+                hasHeader = False
+            elif not (types is None):
+                row = convertRow(row, types, "{:s}:{:d}".format(filename, reader.line_num))
+            yield row
+    finally:
+        f.close()
+
+
+#
+# Apply the column conversion functions to a row
+#
+def convertRow(row, types, location):
+    result = list(row)
+    for i in range(min(len(types), len(result))):
+        if types[i] is None:
+            continue
+        try:
+            result[i] = types[i](result[i])
+        except (TypeError, ValueError):
+            raise ValueError("{:s}: Unable to convert column {:d} value '{:s}' using {:s}.".format(location, i+1, result[i], getattr(types[i], "__name__", str(types[i]))))
+    return result
+
 
 #
 # Import a CSV as row list of columns
@@ -8,27 +78,5 @@ import sys
 # When unspecified, the delimiter is detected automatically.
 # Compatible with Linux and Windows linebreaks.
 #
-def importCSV(filename, delimiter=None):
-    f = open(filename, "r")
-    data = f.read()
-    f.close()
-    if delimiter is None:
-        # The delimiter was not specified. Attempt to auto-detect it.
-        if data.find(";") > -1:
-            delimiter = ";"
-        elif data.find(",") > -1:
-            delimiter = ","
-        elif data.find("\t") > -1:
-            delimiter = "\t"
-        else:
-            print("Fatal: Failed to detect delimiter. Unable to import CSV.")
-            sys.exit(1)
-
-    # Convert linebreak characters
-    data = data.replace("\r\n", "\n").replace("\n\r", "\n").replace("\r", "\n")
-
-    result = []
-    for line in data.split("\n"):
-        columns = line.split(delimiter)
-        result += [columns]
-    return result
+def importCSV(filename, delimiter=None, types=None, hasHeader=False):
+    return list(iterCSV(filename, delimiter, types, hasHeader))
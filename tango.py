@@ -1,65 +1,357 @@
 #!/usr/bin/python
 
-import re
+import logging
+import mmap
+import os
+import tempfile
+from array import array
 from netlists import *
+from instrumentation import debugOutput, getLogger, instrumentation
+
+logger = getLogger("tango")
+
+#
+# Increment, whenever the parser output changes,
+# in order to invalidate cached netlists
+#
+parserVersion = 3
+
+
+#
+# Split the lines of a Tango netlist into blocks
+#
+# Yields tuples of the block delimiter ("[" for components, "(" for nets)
+# and the list of lines inside the block.
+# Only one block is held in memory at a time.
+#
+# The fields of a component block are positional, so blank lines
+# after the designator are kept (e.g. an empty footprint);
+# blank lines in net blocks are skipped.
+# A block ends at a line holding only the closing delimiter.
+# A block opened and closed on the same line, e.g. "(GND)", is accepted as well.
+#
+def tokenize(lines):
+    opening = None
+    block = []
+    for line in lines:
+        line = line.strip()
+
+        if opening is None:
+            # Outside of a block: Wait for the next opening delimiter
+            if (len(line) == 0) or not (line[0] in "[("):
+                continue
+            opening = line[0]
+            closing = "]" if opening == "[" else ")"
+            block = []
+            line = line[1:].strip()
+            # The first line (designator or net label) may contain
+            # the delimiters itself, e.g. "VCC(3V3)", but only
+            # an unbalanced closing delimiter ends the block
+            if line.endswith(closing) and (line.count(closing) > line.count(opening)):
+                line = line[:-1].strip()
+                if len(line) > 0:
+                    block += [line]
+                yield (opening, block)
+                opening = None
+                continue
+
+        if line == closing:
+            yield (opening, block)
+            opening = None
+            continue
+
+        if len(line) > 0:
+            block += [line]
+        elif (opening == "[") and (len(block) > 0):
+            # Empty positional field
+            block += [line]
+
+
+#
+# Read the lines of a Tango netlist file one by one
+#
+def readLines(filename):
+    f = open(filename, "r", encoding="iso8859_15")
+    for line in f:
+        yield cleanupEncoding(line)
+    f.close()
+
+
+#
+# Byte translation table equivalent to decoding ISO 8859-15
+# followed by cleanupEncoding(): Non-ASCII bytes become "?"
+#
+asciiTable = bytes(range(128)) + b"?" * 128
+
+
+#
+# Split a Tango netlist file into blocks like tokenize() does,
+# but yield (opening, block, start, end) tuples
+# with the byte offsets of every block in the file
+#
+def indexBlocks(filename):
+    end = [0]
+
+    def lines():
+        f = open(filename, "rb")
+        for line in f:
+            end[0] += len(line)
+            yield line.translate(asciiTable).decode("ascii")
+        f.close()
+
+    start = 0
+    for opening, block in tokenize(lines()):
+        yield (opening, block, start, end[0])
+        start = end[0]
+
+
+#
+# Read the block between the given byte offsets of a memory-mapped Tango netlist file
+#
+def readBlock(data, start, end):
+    text = data[start:end].translate(asciiTable).decode("ascii")
+    for opening, block in tokenize(text.splitlines()):
+        return block
+    return []
+
+
+#
+# Return the (designator, description, footprint) of a [...] block:
+# designator, footprint and description (missing fields are empty),
+# or None for blocks without designator
+#
+def parseComponentBlock(block):
+    if len(block) < 1:
+        return None
+    fields = block + [""] * 2
+    return (block[0], fields[2], fields[1])
+
+
+#
+# Return the (label, [(designator, pin name), ...]) of a (...) block:
+# net label followed by one "designator,pin" per line,
+# or None for blocks without label
+#
+def parseNetBlock(block):
+    if len(block) < 1:
+        return None
+    pins = []
+    for pin in block[1:]:
+        i = pin.find(",")
+        if i < 0:
+            # Skip illegaly formated lines
+            continue
+        pins += [(pin[:i], pin[i+1:].split(",")[0])]
+    return (block[0], pins)
+
+
+#
+# Index of the byte offsets of the component and net blocks of a Tango netlist file,
+# from which the blocks are read on demand (see Netlist.attachSource)
+#
+# The offsets are only valid as long as the file is not modified,
+# so reading blocks fails once the size or modification time changed.
+#
+class TangoBlockIndex:
+    def __init__(self, filename):
+        self.filename = filename
+        self.fileState = self.getFileState(os.stat(filename))
+        # Byte offsets of the blocks in the file
+        self.componentStarts = array("q")
+        self.componentEnds = array("q")
+        self.netStarts = array("q")
+        self.netEnds = array("q")
+        # Upper-cased designator -> component block index
+        self.componentIndex = {}
+        # Net label and upper-cased net label -> net block index
+        self.netLabelIndex = {}
+        self.netIndex = {}
+        # Upper-cased designator -> indexes of the net blocks it appears in
+        self.netsByDesignator = {}
+
+        for opening, block, start, end in indexBlocks(filename):
+            if len(block) < 1:
+                continue
+            if opening == "[":
+                self.componentIndex.setdefault(block[0].upper(), len(self.componentStarts))
+                self.componentStarts.append(start)
+                self.componentEnds.append(end)
+                continue
+
+            i = len(self.netStarts)
+            self.netLabelIndex.setdefault(block[0], i)
+            self.netIndex.setdefault(block[0].upper(), i)
+            self.netStarts.append(start)
+            self.netEnds.append(end)
+            designators = set([pin.split(",")[0].strip().upper() for pin in block[1:] if pin.find(",") > -1])
+            for designator in designators:
+                nets = self.netsByDesignator.get(designator)
+                if nets is None:
+                    nets = self.netsByDesignator[designator] = array("l")
+                nets.append(i)
+
+    def getComponentCount(self):
+        return len(self.componentStarts)
+
+    def getNetCount(self):
+        return len(self.netStarts)
+
+    def getFileState(self, stat):
+        return (stat.st_size, stat.st_mtime_ns)
+
+    #
+    # Read the blocks with the given indexes from the memory-mapped file
+    #
+    def readBlocks(self, starts, ends, indexes):
+        f = open(self.filename, "rb")
+        if self.getFileState(os.fstat(f.fileno())) != self.fileState:
+            f.close()
+            raise RuntimeError("Netlist {:s} was modified after it was indexed.".format(self.filename))
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        blocks = [readBlock(data, starts[i], ends[i]) for i in indexes]
+        data.close()
+        f.close()
+        return blocks
+
+    def readComponents(self, indexes):
+        return [parseComponentBlock(block) for block in self.readBlocks(self.componentStarts, self.componentEnds, indexes)]
+
+    def readNets(self, indexes):
+        return [parseNetBlock(block) for block in self.readBlocks(self.netStarts, self.netEnds, indexes)]
 
 
 #
 # Parses and handles a netlist in Tango format
 #
+# In lazy mode, only the byte offsets of the component and net blocks
+# are indexed when the file is loaded. Components, nets and pins are created
+# when they are queried through getComponent(), getNet(), getComponentNets()
+# or elaborateComponentConnections(); getComponents() and getNets()
+# load everything that is left.
+#
 class TangoNetlist(Netlist):
-    def __init__(self, filename=None, debug=False):
+    def __init__(self, filename=None, debug=False, lazy=False):
+        Netlist.__init__(self)
         if not (filename is None):
-            self.readFromFile(filename)
-            self.parse(debug)
+            if lazy:
+                self.indexFile(filename, debug)
+            else:
+                self.parseFile(filename, debug)
+
+    #
+    # Parse the given file line by line and generate a
+    # list of components and nets
+    #
+    def parseFile(self, filename, debug=False, debugComponents=False):
+        self.parseLines(readLines(filename), debug, debugComponents)
 
     #
     # Parse the imported text and generate a
     # list of components and nets
     #
     def parse(self, debug=False, debugComponents=False):
-        # Use regular expression to parse components
-        r = re.compile("\[[\r\n]*([^\r\n]+)[\r\n]+([^\r\n]*)[\r\n]+([^\r\n]*)[\r\n]+[^\]]*\]")
-        l = re.findall(r, self.text)
-        self.components = []
-        for result in l:
-            designator = result[0]
-            footprint = result[1]
-            description = result[2]
-            self.components += [ Component(designator=designator, description=description, footprint=footprint) ]
-            if debug:
-                print("{:s}: {:s} ({:s})".format(designator, description, footprint))
-
-        if debug:
-            print("Found {:d} components.".format(len(self.components)))
-            if debugComponents:
-                print([c.getDesignator() for c in self.components])
-
-        # Use regular expression to parse nets
-        r = re.compile("\([\r\n]*([^\r\n]+)[\r\n]+([^\)]*)[\r\n]*\)")
-        l = re.findall(r, self.text)
-        self.nets = []
-        for result in l:
-            netlabel = result[0]
-            net = Net(label=netlabel)
-            pins = result[1].replace("\r", "\n").split("\n")
-
-            for pin in pins:
-                if len(pin.strip()) < 1:
-                    # Skip empty lines
-                    continue
-                if pin.find(",") < 0:
-                    # Skip illegaly formated lines
-                    continue
-                designator = pin.split(",")[0]
-                name = pin.split(",")[1]
-                component = self.getComponent(designator=designator)
-                if component is None:
-                    print("Error: Net '{:s}' references unknown component '{:s}'. Skipping.".format(netlabel, designator))
-                    continue
-                p = component.createPinFromName(name)
-                net.addPin(p)
-
-            self.nets += [net]
-            if debug:
-                print("{:d} pin(s) are connected to net '{:s}': {:s}".format(len(net.getPins()), net.getLabel(), str([str(p) for p in net.getPins()])))
+        self.parseLines(self.text.splitlines(), debug, debugComponents)
+
+    #
+    # Build components and nets incrementally from a sequence of lines
+    #
+    def parseLines(self, lines, debug=False, debugComponents=False):
+        with debugOutput(debug):
+            with instrumentation.phase("parse"):
+                self.clear()
+                componentsDone = False
+                for opening, block in tokenize(lines):
+                    if opening == "[":
+                        self.parseComponent(block)
+                        continue
+
+                    if not componentsDone:
+                        componentsDone = True
+                        logger.debug("Found %d components.", len(self.components))
+                        if debugComponents:
+                            logger.debug("%s", [c.getDesignator() for c in self.components])
+
+                    self.parseNet(block)
+
+            instrumentation.count("components", len(self.components))
+            instrumentation.count("nets", len(self.nets))
+            instrumentation.count("pins", len(self.netsByPin))
+
+    #
+    # Index the blocks of the given file for lazy loading
+    #
+    def indexFile(self, filename, debug=False):
+        with debugOutput(debug):
+            with instrumentation.phase("index"):
+                index = TangoBlockIndex(filename)
+                self.attachSource(index)
+            logger.debug("Indexed %d components and %d nets.", index.getComponentCount(), index.getNetCount())
+            instrumentation.count("componentBlocks", index.getComponentCount())
+            instrumentation.count("netBlocks", index.getNetCount())
+
+    #
+    # Create a component from the lines of a [...] block:
+    # designator, footprint and description
+    #
+    def parseComponent(self, block):
+        component = parseComponentBlock(block)
+        if component is None:
+            # Skip component blocks without designator
+            return
+        designator, description, footprint = component
+        self.addComponent(Component(designator=designator, description=description, footprint=footprint))
+        logger.debug("%s: %s (%s)", designator, description, footprint)
+
+    #
+    # Create a net from the lines of a (...) block:
+    # net label followed by one pin per line
+    #
+    def parseNet(self, block):
+        entry = parseNetBlock(block)
+        if entry is None:
+            # Skip nets without label
+            return
+        net = self.createNet(entry[0], entry[1])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%d pin(s) are connected to net '%s': %s", len(net.getPins()), net.getLabel(), str([str(p) for p in net.getPins()]))
+
+
+if __name__ == "__main__":
+    # Test data: A component with an empty footprint,
+    # a description containing brackets, net labels containing parentheses
+    # and net labels only differing in case
+    content = "[\nC1\n\n100n\n\n\n\n]\n" \
+              "[\nR1\nR0603\n10k [1%]\n]\n" \
+              "(\nVCC(3V3)\nC1,1\nR1,1\n)\n" \
+              "(GND)\n" \
+              "(\nSENSE\n\nC1,2\nR1,2\n)\n" \
+              "(\ngnd\nC1,3\n)\n"
+    expectedComponents = [("C1", "", "100n"), ("R1", "R0603", "10k [1%]")]
+    expectedNets = [("VCC(3V3)", ["C1,1", "R1,1"]), ("GND", []), ("SENSE", ["C1,2", "R1,2"]), ("gnd", ["C1,3"])]
+
+    # Test
+    fd, filename = tempfile.mkstemp(suffix=".net")
+    f = os.fdopen(fd, "w")
+    f.write(content)
+    f.close()
+    for lazy in [False, True]:
+        netlist = TangoNetlist(filename, lazy=lazy)
+        components = [(c.getDesignator(), c.getFootprint(), c.getDescription()) for c in netlist.getComponents()]
+        labels = [netlist.getNet(label).getLabel() for label in ["gnd", "GND", "Gnd"]]
+        nets = [(n.getLabel(), [str(p) for p in n.getPins()]) for n in netlist.getNets()]
+
+        # Test result evaluation
+        if components != expectedComponents:
+            print("Test failed: Got the components {:s} instead of {:s}.".format(str(components), str(expectedComponents)))
+            os.remove(filename)
+            exit(5)
+        if labels != ["gnd", "GND", "GND"]:
+            print("Test failed: Looked up the nets {:s} instead of gnd, GND, GND.".format(", ".join(labels)))
+            os.remove(filename)
+            exit(5)
+        if nets != expectedNets:
+            print("Test failed: Got the nets {:s} instead of {:s}.".format(str(nets), str(expectedNets)))
+            os.remove(filename)
+            exit(5)
+    os.remove(filename)
+    print("Test succeeded: Parsed {:d} components and {:d} nets.".format(len(expectedComponents), len(expectedNets)))
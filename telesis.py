@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+
+import logging
+from netlists import *
+from instrumentation import debugOutput, getLogger, instrumentation
+from tokenizer import readLogicalLines
+
+logger = getLogger("telesis")
+
+#
+# Increment, whenever the parser output changes,
+# in order to invalidate cached netlists
+#
+parserVersion = 1
+
+
+#
+# Remove the single quotes around a Telesis name, e.g. 'GND'
+#
+def unquoteName(name):
+    name = name.strip()
+    if (len(name) > 1) and name.startswith("'") and name.endswith("'"):
+        return name[1:-1]
+    return name
+
+
+#
+# Parses and handles a netlist in Telesis format,
+# as exported by Cadence Allegro/OrCAD (and others)
+#
+#   $PACKAGES
+#   'SOIC8' ! 'LM358' ; U1 U2
+#   R0603 ! RES ! 10K ; R1 R2
+#   $NETS
+#   'GND' ; U1.4 U2.4 R1.2 ,
+#    R2.2
+#   $END
+#
+# Lines ending with a comma continue on the next line.
+# Packages need to be listed before the nets.
+#
+class TelesisNetlist(Netlist):
+    def __init__(self, filename=None, debug=False):
+        Netlist.__init__(self)
+        if not (filename is None):
+            self.parseFile(filename, debug)
+
+    #
+    # Parse the given file line by line and generate a
+    # list of components and nets
+    #
+    def parseFile(self, filename, debug=False):
+        with debugOutput(debug):
+            with instrumentation.phase("parse"):
+                self.clear()
+                section = None
+                for line in readLogicalLines(filename):
+                    if line.startswith("$"):
+                        section = line.split()[0].upper()
+                        if section == "$END":
+                            break
+                        continue
+                    if section == "$PACKAGES":
+                        self.parsePackage(line)
+                    elif section == "$NETS":
+                        self.parseNet(line)
+
+            instrumentation.count("components", len(self.components))
+            instrumentation.count("nets", len(self.nets))
+            instrumentation.count("pins", len(self.netsByPin))
+
+    #
+    # Create the components of a package line:
+    # package ! device [! value] ; designators
+    #
+    def parsePackage(self, line):
+        i = line.find(";")
+        if i < 0:
+            # Skip illegaly formated lines
+            return
+        fields = [unquoteName(field) for field in line[:i].split("!")]
+        footprint = fields[0]
+        description = ""
+        for field in fields[1:]:
+            if len(field) > 0:
+                description = field
+        for designator in line[i+1:].replace(",", " ").split():
+            self.addComponent(Component(designator=designator, description=description, footprint=footprint))
+            logger.debug("%s: %s (%s)", designator, description, footprint)
+
+    #
+    # Create a net from a net line:
+    # net label ; designator.pin designator.pin ...
+    #
+    def parseNet(self, line):
+        i = line.find(";")
+        if i < 0:
+            # Skip illegaly formated lines
+            return
+        netlabel = unquoteName(line[:i])
+        if len(netlabel) == 0:
+            # Skip nets without label
+            return
+        pins = []
+        for pin in line[i+1:].replace(",", " ").split():
+            j = pin.find(".")
+            if j < 1:
+                # Skip illegaly formated pins
+                continue
+            pins += [(pin[:j], pin[j+1:])]
+        net = self.createNet(netlabel, pins)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%d pin(s) are connected to net '%s': %s", len(net.getPins()), net.getLabel(), str([str(p) for p in net.getPins()]))
@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+#
+# This file provides the streaming tokenizers shared by the netlist importers:
+# S-expressions (KiCad, EDIF) and line-based formats with continuation lines (Telesis)
+#
+# Files are read in chunks, so that only the element currently being parsed
+# is held in memory, no matter how large the netlist is.
+#
+
+import re
+
+from netlists import cleanupEncoding
+
+#
+# Number of characters read at a time
+#
+chunkSize = 1024 * 1024
+
+#
+# One token: parenthesis, quoted string (possibly cut off at the end of a chunk) or atom
+#
+regex_token = re.compile("[()]|\"(?:[^\"\\\\]|\\\\.)*(?:\"|\\\\?\\Z)|[^\\s()\"]+")
+regex_escape = re.compile("\\\\(.)")
+
+
+#
+# Read a file in chunks of characters
+#
+def readChunks(filename, encoding="iso8859_15"):
+    f = open(filename, "r", encoding=encoding, errors="replace")
+    while True:
+        chunk = f.read(chunkSize)
+        if len(chunk) == 0:
+            break
+        yield cleanupEncoding(chunk)
+    f.close()
+
+
+#
+# Split a sequence of chunks into S-expression tokens
+#
+# Yields "(", ")" and atoms; quoted strings keep their quotes
+# (see unquote()), so that they can be told apart from parentheses.
+#
+def tokenizeSExpressions(chunks):
+    rest = ""
+    for chunk in chunks:
+        buffer = rest + chunk
+        tokens = regex_token.findall(buffer)
+        rest = ""
+        if (len(tokens) > 0) and buffer.endswith(tokens[-1]):
+            # The last token may continue in the next chunk
+            rest = tokens.pop()
+        yield from tokens
+    yield from regex_token.findall(rest)
+
+
+#
+# Remove the quotes and escapes of a quoted string token
+#
+def unquote(token):
+    if token.startswith("\""):
+        token = token[1:-1] if (len(token) > 1) and token.endswith("\"") else token[1:]
+        if token.find("\\") > -1:
+            token = regex_escape.sub("\\1", token)
+    return token
+
+
+#
+# Stream through S-expression tokens and yield the elements,
+# whose (lower-cased) head is in names, as (path, element) tuples
+#
+# Elements are nested lists, e.g. ["net", ["code", "1"], ["name", "GND"]],
+# with lower-cased heads and unquoted atoms. Only the requested elements
+# are built, everything else is skipped.
+# path lists (head, name) tuples of the enclosing elements, where name is
+# the first argument of the element, or the first argument of a
+# rename element in its place (e.g. "(cell (rename ...) ...)" in EDIF), or None.
+#
+def iterElements(tokens, names):
+    tokens = iter(tokens)
+    # Frames of the open elements: [head, name, argument count, parent frame to name]
+    stack = []
+    for token in tokens:
+        if token == "(":
+            frame = [None, None, 0, None]
+            if len(stack) > 0:
+                parent = stack[-1]
+                parent[2] += 1
+                if parent[2] == 1:
+                    frame[3] = parent
+            stack += [frame]
+            continue
+
+        if token == ")":
+            if len(stack) > 0:
+                stack.pop()
+            continue
+
+        if len(stack) == 0:
+            continue
+        frame = stack[-1]
+        if frame[0] is None:
+            frame[0] = token.lower()
+            if frame[0] in names:
+                stack.pop()
+                element = readElement(tokens, frame[0])
+                yield ([(f[0], f[1]) for f in stack], element)
+            continue
+
+        frame[2] += 1
+        if frame[2] == 1:
+            frame[1] = unquote(token)
+            if (frame[0] == "rename") and not (frame[3] is None):
+                frame[3][1] = frame[1]
+
+
+#
+# Build the rest of an element, whose opening parenthesis and head
+# have already been consumed, from the tokens up to its closing parenthesis
+#
+def readElement(tokens, head):
+    element = [head]
+    stack = []
+    for token in tokens:
+        if token == "(":
+            stack += [element]
+            element = []
+        elif token == ")":
+            if len(stack) == 0:
+                break
+            child = element
+            element = stack.pop()
+            element += [child]
+        elif len(element) == 0:
+            element += [token.lower()]
+        elif token[0] == "\"":
+            element += [unquote(token)]
+        else:
+            element += [token]
+    return element
+
+
+#
+# Return the first child element of an element with the given head or None
+#
+def findChild(element, head):
+    for child in element[1:]:
+        if isinstance(child, list) and (child[0] == head):
+            return child
+    return None
+
+
+#
+# Return all child elements of an element with the given head
+#
+def findChildren(element, head):
+    return [child for child in element[1:] if isinstance(child, list) and (child[0] == head)]
+
+
+#
+# Return the first argument of the child element with the given head,
+# e.g. "R1" for getValue(["comp", ["ref", "R1"]], "ref"), or the given default
+#
+def getValue(element, head, default=None):
+    child = findChild(element, head)
+    if (child is None) or (len(child) < 2) or isinstance(child[1], list):
+        return default
+    return child[1]
+
+
+#
+# Read the lines of a file one by one, joining lines
+# which end with the continuation character with the next line
+#
+# Leading and trailing whitespace is removed and empty lines are skipped.
+#
+def readLogicalLines(filename, continuation=",", encoding="iso8859_15"):
+    f = open(filename, "r", encoding=encoding, errors="replace")
+    pending = ""
+    for line in f:
+        line = cleanupEncoding(line).strip()
+        if line.endswith(continuation):
+            pending += line[:-len(continuation)] + " "
+            continue
+        line = (pending + line).strip()
+        pending = ""
+        if len(line) > 0:
+            yield line
+    f.close()
+    pending = pending.strip()
+    if len(pending) > 0:
+        yield pending
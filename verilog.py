@@ -5,8 +5,15 @@
 # and for evaluation of simple assertions
 #
 
+import concurrent.futures
+import mmap
+import os
 import re
+import tempfile
+import time
+from array import array
 from netlists import Netlist
+from instrumentation import instrumentation
 
 #
 # A list of submodules accepted as primitives
@@ -18,17 +25,106 @@ primitives = [
     "SB_PLL40_CORE"
 ]
 
+#
+# Output ports of primitives;
+# all other ports count towards the fan-out of the connected net
+#
+primitiveOutputs = {
+    "SB_LUT4": ["O"],
+    "SB_CARRY": ["CO"],
+    "SB_DFF": ["Q"],
+    "SB_DFFE": ["Q"],
+    "SB_DFFER": ["Q"],
+    "SB_DFFES": ["Q"],
+    "SB_DFFSR": ["Q"],
+    "SB_DFFSS": ["Q"],
+    "SB_GB": ["GLOBAL_BUFFER_OUTPUT"],
+    "SB_IO": ["D_IN_0", "D_IN_1"],
+    "SB_PLL40_CORE": ["PLLOUTCORE", "PLLOUTGLOBAL", "LOCK", "SDO"],
+    "SB_RAM40_4K": ["RDATA"],
+}
+
 #
 # Some regular expressions to help us parsing
 #
-pattern_module              = "module[\t ]+[a-zA-Z0-9\_]+[\t ]*\(([^\)]+)\);"
-regex_module                = re.compile(pattern_module)
-pattern_signal              = "[a-zA-Z0-9\_\.\[\:\]]+"
-pattern_signal_or_literal   = "[a-zA-Z0-9\_\.\[\:\]\']+"
+pattern_identifier          = "\\\\[^\\s]+|[a-zA-Z0-9\\_\\.\\$]+"
 regex_literal_decimal       = re.compile("[0-9]+")
 regex_literal_hexadecimal   = re.compile("[0-9]+\'h[0-9a-fA-FxX]+")
 regex_literal_binary        = re.compile("[0-9]+\'b[0-1xX]+")
-regex_assign                = re.compile("[\t ]*assign[\t ]+[\\\\]*(" + pattern_signal + ")[\t ]*=[\t ]*(" + pattern_signal_or_literal + ")[\t ]*;[\t ]*\n")
+regex_range                 = re.compile("\\[[\t ]*(-?[0-9]+)[\t ]*(?:\\:[\t ]*(-?[0-9]+)[\t ]*)?\\]")
+regex_reference             = re.compile("(" + pattern_identifier + ")[\t ]*(\\[[^\\]]*\\])?")
+regex_connection            = re.compile("\\.[\t\r\n ]*(" + pattern_identifier + ")[\t\r\n ]*\\(([^)]*)\\)")
+regex_declaration_token     = re.compile("(?P<escaped>\\\\[^\\s]+)|(?P<range>\\[[^\\]]*\\])|(?P<comma>,)|(?P<word>[^\\s,\\[]+)")
+
+#
+# All statements relevant to us, matched in a single pass over the file;
+# comments and attributes are matched as well, so that their content is skipped
+#
+regex_statement = re.compile(
+    "(?P<comment>//[^\\n]*|/\\*.*?\\*/|\\(\\*.*?\\*\\))"
+    "|(?<![^\\s;])module[\\t\\r\\n ]+(?:" + pattern_identifier + ")[\\t\\r\\n ]*(?:\\((?P<ports>[^;]*)\\))?[\\t\\r\\n ]*;"
+    "|(?<![^\\s;])(?P<direction>input|output|inout)(?P<declaration>[\\t\\r\\n \\[][^;]*);"
+    "|(?<![^\\s;])assign[\\t\\r\\n ]+(?P<lhs>[^=;]+?)[\\t\\r\\n ]*=[\\t\\r\\n ]*(?P<rhs>[^;]*?)[\\t\\r\\n ]*;"
+    "|(?<![^\\s;])(?P<endmodule>endmodule)(?![^\\s;])"
+    "|(?<![^\\s;])(?!(?:module|endmodule|assign|input|output|inout|wire|reg)[\\s(#;\\[])"
+    "(?P<celltype>" + pattern_identifier + ")[\\t\\r\\n ]*(?:#[\\t\\r\\n ]*\\([^;]*?\\)[\\t\\r\\n ]*)?"
+    "(?P<instance>" + pattern_identifier + ")[\\t\\r\\n ]*\\((?P<connections>[^;]*?)\\)[\\t\\r\\n ]*;",
+    re.DOTALL
+)
+regex_statement_bytes = re.compile(regex_statement.pattern.encode("ascii"), re.DOTALL)
+
+
+#
+# Decode an identifier or expression matched in a bytes buffer
+#
+def decodeBytes(b):
+    return b.decode("ascii", "replace")
+
+
+#
+# Bring a signal reference into its canonical form:
+# No backslash for escaped identifiers and
+# no whitespace between identifier and bit select
+#
+def normalizeReference(expression):
+    expression = expression.strip()
+    match = regex_reference.fullmatch(expression)
+    if match is None:
+        return expression
+    name = match.group(1)
+    if name.startswith("\\"):
+        name = name[1:]
+    if match.group(2) is None:
+        return name
+    return name + match.group(2).replace(" ", "").replace("\t", "")
+
+
+#
+# Return the ID of a string in a string table,
+# adding it to the table if necessary
+#
+def getStringId(strings, ids, s):
+    i = ids.get(s)
+    if i is None:
+        i = len(strings)
+        strings += [s]
+        ids[s] = i
+    return i
+
+
+#
+# Split a port reference like "data[3]" into name and index (or None)
+#
+def splitPortReference(reference):
+    reference = normalizeReference(reference)
+    if reference.endswith("]"):
+        i = reference.rfind("[")
+        if i > 0:
+            try:
+                return (reference[:i], int(reference[i+1:-1]))
+            except ValueError:
+                return (reference[:i], None)
+    return (reference, None)
 
 
 #
@@ -58,27 +154,27 @@ class assertion:
 
     def netIsConstant(netlist, net):
         #
-        # If it is constant, then there must be
-        # a line in the form: assign netname = literal;
+        # If it is constant, then there must be a chain of lines
+        # in the form: assign netname = alias; ... assign alias = literal;
         #
-        assign = netlist.findAssign(net)
+        driver = netlist.resolveDriver(net)
 
-        if assign is None:
+        if driver is None:
             return assertion.result(success=True, message="Net {:s} is not driven at all (and therefore constant).".format(net))
 
-        if assertion.isLiteral(expression=assign["rhs"])["success"]:
+        if driver[1]:
             return assertion.result(success=True, message="Net {:s} is driven by a constant.".format(net))
 
         return assertion.result(success=False, message="Net {:s} is driven by something but not by a constant.".format(net))
 
     def netIsNotConstant(netlist, net):
-        assign = netlist.findAssign(net)
+        driver = netlist.resolveDriver(net)
 
-        if assign is None:
+        if driver is None:
             return assertion.result(success=False, message="Net {:s} is not driven at all.".format(net))
 
-        if assertion.isLiteral(expression=assign["rhs"])["success"]:
-            return assertion.result(success=False, message="Net {:s} is driven by a constant: {:s}".format(net, assign["rhs"]))
+        if driver[1]:
+            return assertion.result(success=False, message="Net {:s} is driven by a constant: {:s}".format(net, driver[0]))
 
         return assertion.result(success=True, message="Net {:s} is driven by something but not by a constant.".format(net))
 
@@ -88,51 +184,318 @@ class assertion:
 #
 # class File(Netlist):
 class File():
-    def __init__(self, filename):
-        f = open(filename, "r")
-        self.content = f.read()
-        f.close()
-        self.lines = self.content.split("\n")
-        self.parsePorts()
-        self.parseAssigns()
-
-    # Parse all ports of the first module in the given file
-    def parsePorts(self):
-        self.ports = []
-        modules = re.findall(regex_module, self.content)
-        if len(modules) < 1:
-            return;
-        self.ports = modules[0].replace(" ", "").split(",")
+    #
+    # Import the given file
+    #
+    # With useMmap=True the file is memory-mapped and scanned as bytes
+    # instead of being read into a string, so that very large netlists
+    # do not need to fit into memory; only the matched identifiers are decoded.
+    #
+    def __init__(self, filename, useMmap=False):
+        if useMmap:
+            f = open(filename, "rb")
+            try:
+                content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can not be mapped
+                content = b""
+            f.close()
+        else:
+            with instrumentation.phase("read"):
+                f = open(filename, "r")
+                content = f.read()
+                f.close()
+
+        with instrumentation.phase("parse"):
+            self.parse(content)
+        if isinstance(content, mmap.mmap):
+            content.close()
+        instrumentation.count("assigns", len(self.assigns))
+        instrumentation.count("cells", len(self.cellType))
+
+    #
+    # Tokenize the file content (str, bytes or mmap) in a single pass
+    # and collect the ports of the first module and all assign statements
+    #
+    def parse(self, content):
+        if isinstance(content, str):
+            regex = regex_statement
+            decode = str
+        else:
+            regex = regex_statement_bytes
+            decode = decodeBytes
+
+        # Port name -> (msb, lsb) or None for single-bit ports
+        self.ports = {}
+        self.assigns = []
+        # Lower-case lhs -> assign
+        self.assignsByLhs = {}
+        # Lower-case lhs -> (ultimate driver, driver is constant),
+        # resolved on demand
+        self.drivers = None
+
+        # Cell instances in columnar form:
+        # Cell i has type cellTypeNames[cellType[i]] and name cellNames[i].
+        # Its connections are connectionPort/connectionNet[cellOffsets[i]:cellOffsets[i+1]],
+        # which are IDs into portNames and netNames.
+        self.cellTypeNames = []
+        self.cellTypeIds = {}
+        self.cellType = array("l")
+        self.cellNames = []
+        self.cellOffsets = array("l", [0])
+        self.portNames = []
+        self.portIds = {}
+        self.netNames = []
+        self.netIds = {}
+        self.connectionPort = array("l")
+        self.connectionNet = array("l")
+        # Net ID -> fan-out, calculated on demand
+        self.fanouts = None
+
+        moduleCount = 0
+        for match in regex.finditer(content):
+            if not (match.group("lhs") is None):
+                self.addAssign(normalizeReference(decode(match.group("lhs"))), normalizeReference(decode(match.group("rhs"))))
+            elif not (match.group("direction") is None):
+                if moduleCount == 1:
+                    self.parsePortDeclaration(decode(match.group("declaration")))
+            elif not (match.group("endmodule") is None):
+                if moduleCount == 1:
+                    moduleCount += 1
+            elif not (match.group("instance") is None):
+                self.addCell(decode(match.group("celltype")), decode(match.group("instance")), decode(match.group("connections")))
+            elif match.group("comment") is None:
+                # Module header
+                moduleCount += 1
+                if (moduleCount == 1) and not (match.group("ports") is None):
+                    self.parsePortDeclaration(decode(match.group("ports")))
+
+    #
+    # Parse a port declaration, either from the module header
+    # or from an input/output/inout statement:
+    # The last word before each comma is a port name,
+    # a range in front of the first name denotes a multi-bit port.
+    # Escaped identifiers may contain brackets and commas, e.g. \led[0] ,
+    # so the declaration is tokenized instead of split.
+    #
+    def parsePortDeclaration(self, declaration):
+        width = None
+        # Ranges only count in front of the first name
+        # (or after a direction keyword in the module header)
+        expectRange = True
+        name = None
+        for match in regex_declaration_token.finditer(declaration + ","):
+            if not (match.group("comma") is None):
+                if not (name is None):
+                    self.addPort(name, width)
+                name = None
+            elif not (match.group("range") is None):
+                bits = regex_range.fullmatch(match.group("range"))
+                if expectRange and not (bits is None):
+                    msb = int(bits.group(1))
+                    lsb = msb if bits.group(2) is None else int(bits.group(2))
+                    width = (msb, lsb)
+            elif not (match.group("escaped") is None):
+                name = normalizeReference(match.group("escaped"))
+                expectRange = False
+            elif match.group("word") in ["input", "output", "inout"]:
+                width = None
+                expectRange = True
+            elif not (match.group("word") in ["wire", "reg", "signed"]):
+                name = normalizeReference(match.group("word"))
+                expectRange = False
+
+    # Add a module port, keeping the width from a previous declaration
+    def addPort(self, name, width):
+        if (width is None) and (name in self.ports):
+            return
+        self.ports[name] = width
 
     # Find a module port
     def hasPort(self, portname):
-        # Remove the indices
-        i = portname.find("[")
-        if i > -1:
-            portname = portname[:i].strip()
-        return (portname in self.ports)
+        if normalizeReference(portname) in self.ports:
+            # Also matches escaped identifiers like \led[0]
+            return True
+        portname, index = splitPortReference(portname)
+        if not (portname in self.ports):
+            return False
+        width = self.ports[portname]
+        if (index is None) or (width is None):
+            return True
+        return min(width) <= index <= max(width)
 
-    # Parse all assign statements into an array
-    def parseAssigns(self):
-        results = re.findall(regex_assign, self.content)
-        # print(results)
+    # Add an assign statement
+    def addAssign(self, lhs, rhs):
+        assign = {"lhs": lhs, "rhs": rhs}
+        self.assigns += [assign]
+        key = lhs.lower()
+        if not (key in self.assignsByLhs):
+            self.assignsByLhs[key] = assign
+            self.drivers = None
 
-        self.assigns = []
-        for result in results:
-            lhs = result[0]
-            rhs = result[1]
-            # print("{:s} - {:s}".format(lhs, rhs))
-            # print("assign {:s} = {:s};".format(lhs, rhs))
-            assign = {"lhs": lhs, "rhs": rhs}
-            self.assigns += [assign]
+    #
+    # Add a cell instance with its named port connections, e.g. ".I0(clk), .O(_01_)";
+    # concatenations are split into the individual nets, constants are skipped
+    #
+    def addCell(self, cellType, name, connections):
+        self.cellType.append(getStringId(self.cellTypeNames, self.cellTypeIds, normalizeReference(cellType)))
+        self.cellNames += [normalizeReference(name)]
+        for match in regex_connection.finditer(connections):
+            port = getStringId(self.portNames, self.portIds, normalizeReference(match.group(1)))
+            expression = match.group(2).strip()
+            if expression.startswith("{") and expression.endswith("}"):
+                nets = expression[1:-1].split(",")
+            else:
+                nets = [expression]
+            for net in nets:
+                net = normalizeReference(net)
+                if (len(net) == 0) or assertion.isLiteral(expression=net)["success"]:
+                    # Unconnected port or constant
+                    continue
+                self.connectionPort.append(port)
+                self.connectionNet.append(getStringId(self.netNames, self.netIds, net))
+        self.cellOffsets.append(len(self.connectionNet))
+        self.fanouts = None
+
+    #
+    # Return the number of cell instances (of the given type)
+    #
+    def getCellCount(self, cellType=None):
+        if cellType is None:
+            return len(self.cellType)
+        i = self.cellTypeIds.get(cellType)
+        if i is None:
+            return 0
+        return self.cellType.count(i)
+
+    #
+    # Return the number of instances per cell type
+    #
+    def getCellTypeCounts(self):
+        counts = [0] * len(self.cellTypeNames)
+        for i in self.cellType:
+            counts[i] += 1
+        return dict(zip(self.cellTypeNames, counts))
+
+    #
+    # Count the cell input ports connected to each net
+    #
+    def calculateFanouts(self):
+        fanouts = array("l", [0] * len(self.netNames))
+        outputs = {}
+        for cellType, name in enumerate(self.cellTypeNames):
+            outputs[cellType] = set([self.portIds[port] for port in primitiveOutputs.get(name, []) if port in self.portIds])
+        for i in range(len(self.cellType)):
+            cellOutputs = outputs[self.cellType[i]]
+            for j in range(self.cellOffsets[i], self.cellOffsets[i+1]):
+                if not (self.connectionPort[j] in cellOutputs):
+                    fanouts[self.connectionNet[j]] += 1
+        self.fanouts = fanouts
+
+    #
+    # Return the fan-out of the given net
+    # (the number of cell ports it is connected to,
+    # except for output ports of known primitives)
+    #
+    def getFanout(self, netlabel):
+        if self.fanouts is None:
+            self.calculateFanouts()
+        i = self.netIds.get(normalizeReference(netlabel))
+        if i is None:
+            return 0
+        return self.fanouts[i]
+
+    #
+    # Return the fan-out of all nets connected to cells
+    #
+    def getFanouts(self):
+        if self.fanouts is None:
+            self.calculateFanouts()
+        return dict(zip(self.netNames, self.fanouts))
 
     # Find an assign statement for the given netlabel
     def findAssign(self, netlabel):
-        netlabel = netlabel.lower()
-        for assign in self.assigns:
-            if assign["lhs"].lower() == netlabel:
-                return assign
-        return None
+        return self.assignsByLhs.get(normalizeReference(netlabel).lower())
+
+    #
+    # Follow the chain of assign statements from every net to its ultimate driver:
+    # a literal, a net which is not assigned (port, cell output) or a loop.
+    # Each net is visited once, as all nets on a chain share the result.
+    #
+    def resolveDrivers(self):
+        drivers = {}
+        for key in self.assignsByLhs.keys():
+            if key in drivers:
+                continue
+            path = []
+            visited = set()
+            current = key
+            while True:
+                if current in drivers:
+                    driver = drivers[current]
+                    break
+                rhs = self.assignsByLhs[current]["rhs"]
+                path += [current]
+                visited.add(current)
+                if assertion.isLiteral(expression=rhs)["success"]:
+                    driver = (rhs, True)
+                    break
+                following = rhs.lower()
+                if (not (following in self.assignsByLhs)) or (following in visited):
+                    driver = (rhs, False)
+                    break
+                current = following
+            for net in path:
+                drivers[net] = driver
+
+        # Publish the complete table only,
+        # as assertions may be evaluated by multiple threads
+        self.drivers = drivers
+
+    #
+    # Return the ultimate driver of the given net as tuple
+    # (driver expression, driver is constant) or None, if it is not assigned
+    #
+    def resolveDriver(self, netlabel):
+        if self.drivers is None:
+            with instrumentation.phase("index"):
+                self.resolveDrivers()
+        return self.drivers.get(normalizeReference(netlabel).lower())
+
+
+#
+# Evaluate a list of assertions and collect the results,
+# including the evaluation time in seconds
+#
+def evaluateAssertions(netlist, assertions, stopOnFatal=False):
+    results = []
+    for assertion in assertions:
+        start = time.perf_counter()
+        result = dict(assertion[0](netlist, assertion[1]))
+        result["time"] = time.perf_counter() - start
+        result["fatal"] = ("fatal" in result.keys()) and result["fatal"]
+        result["assertion"] = assertion[0].__name__
+        result["argument"] = assertion[1]
+        results += [result]
+        if stopOnFatal and result["fatal"]:
+            break
+    return results
+
+
+#
+# The netlist of a process pool worker,
+# transferred once per worker instead of once per batch
+#
+workerNetlist = None
+
+
+def initWorker(netlist):
+    global workerNetlist
+    workerNetlist = netlist
+
+
+def evaluateAssertionsInWorker(assertions, stopOnFatal=False):
+    return evaluateAssertions(workerNetlist, assertions, stopOnFatal)
 
 
 #
@@ -146,11 +509,19 @@ class Assertions():
         self.assertions += [[assertion, arg0]]
 
     def apply(self, netlist):
+        results = []
+        for assertion in self.assertions:
+            results += [self.applyAssertion(netlist, assertion)]
+        return self.summarize(results)
+
+    #
+    # Count the succeeded, failed and fatal results
+    #
+    def summarize(self, results):
         succeeded = 0
         failed = 0
         fatal = 0
-        for assertion in self.assertions:
-            result = self.applyAssertion(netlist, assertion)
+        for result in results:
             if result["success"]:
                 succeeded += 1
             else:
@@ -159,6 +530,48 @@ class Assertions():
                 fatal += 1
         return {"succeeded": succeeded, "failed": failed, "fatal": fatal}
 
+    #
+    # Evaluate all assertions in batches on a thread or process pool
+    # and return the list of results (in the order of the assertions)
+    # instead of printing them
+    #
+    # Each result holds success, message, fatal, time,
+    # assertion (function name) and argument.
+    # With stopOnFatal=True, no results after the first fatal one are returned
+    # and pending batches are cancelled.
+    #
+    def applyBatch(self, netlist, workers=None, useProcesses=False, stopOnFatal=False, batchSize=256):
+        if workers == 1:
+            return evaluateAssertions(netlist, self.assertions, stopOnFatal)
+
+        # Resolve the drivers once here, instead of once per thread or
+        # worker process; the resolved table is transferred with the netlist
+        if netlist.drivers is None:
+            with instrumentation.phase("index"):
+                netlist.resolveDrivers()
+
+        batches = [self.assertions[i:i+batchSize] for i in range(0, len(self.assertions), batchSize)]
+        if useProcesses:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(netlist,))
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+        results = []
+        try:
+            if useProcesses:
+                futures = [executor.submit(evaluateAssertionsInWorker, batch, stopOnFatal) for batch in batches]
+            else:
+                futures = [executor.submit(evaluateAssertions, netlist, batch, stopOnFatal) for batch in batches]
+            for future in futures:
+                batchResults = future.result()
+                results += batchResults
+                if stopOnFatal and (len(batchResults) > 0) and batchResults[-1]["fatal"]:
+                    break
+        finally:
+            # Also cancels the pending batches, if one failed or was fatal
+            executor.shutdown(wait=True, cancel_futures=True)
+        return results
+
     def applyAssertion(self, netlist, assertion):
         result = assertion[0](netlist, assertion[1])
         if result["success"]:
@@ -168,3 +581,34 @@ class Assertions():
             # print("[FAILED]  {:s}(\"{:s}\"): {:s}".format(str(assertion[0]), str(assertion[1]), result["message"]))
             print("[FAILED]  {:s}".format(result["message"]))
         return result
+
+
+if __name__ == "__main__":
+    # Test data: bit-blasted ports with escaped identifiers, as written by Yosys
+    content = "module top(\\led[0] , \\a.b , clk);\n" \
+              "  output \\led[0] ;\n" \
+              "  input \\a.b ;\n" \
+              "  input [3:0] clk;\n" \
+              "  assign \\led[0]  = \\a.b ;\n" \
+              "endmodule\n"
+    expectedPorts = {"led[0]": None, "a.b": None, "clk": (3, 0)}
+
+    # Test
+    fd, filename = tempfile.mkstemp(suffix=".v")
+    f = os.fdopen(fd, "w")
+    f.write(content)
+    f.close()
+    for useMmap in [False, True]:
+        module = File(filename, useMmap)
+
+        # Test result evaluation
+        if module.ports != expectedPorts:
+            print("Test failed: Got the ports {:s} instead of {:s}.".format(str(module.ports), str(expectedPorts)))
+            os.remove(filename)
+            exit(5)
+        if not (module.hasPort("led[0]") and module.hasPort("\\a.b") and module.hasPort("clk[3]")) or module.hasPort("clk[4]"):
+            print("Test failed: Port lookup failed.")
+            os.remove(filename)
+            exit(5)
+    os.remove(filename)
+    print("Test succeeded: Detected the ports {:s}.".format(", ".join(sorted(expectedPorts.keys()))))
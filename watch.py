@@ -0,0 +1,298 @@
+#!/usr/bin/python3
+#
+# This file keeps the input files of a set of boards parsed in memory
+# and regenerates their pin constraint files whenever an input changes
+#
+# The jobs are read from a manifest, as described in batch.py.
+# Changes are detected using inotify on Linux
+# and by polling the modification times elsewhere.
+#
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+import cache
+from batch import importManifest, parseSharedFile
+from cache import Cache
+from converter import Converter
+from formats import loadNetlist
+
+#
+# inotify constants, see <sys/inotify.h>
+#
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_NONBLOCK    = 0x00000800
+inotifyEventHeader = struct.Struct("iIII")
+
+
+#
+# Detects file changes by comparing modification time and size
+#
+class PollingMonitor:
+    def __init__(self, filenames, interval=1.0):
+        self.interval = interval
+        self.states = {}
+        for filename in filenames:
+            self.states[filename] = self.getState(filename)
+
+    def getState(self, filename):
+        try:
+            stat = os.stat(filename)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    #
+    # Block until at least one file changed
+    # and return the set of changed files
+    #
+    def wait(self):
+        while True:
+            time.sleep(self.interval)
+            changed = set()
+            for filename, state in self.states.items():
+                current = self.getState(filename)
+                if current != state:
+                    self.states[filename] = current
+                    changed.add(filename)
+            if len(changed) > 0:
+                return changed
+
+    def close(self):
+        pass
+
+
+#
+# Detects file changes using the Linux inotify API
+#
+# The directories are watched instead of the files,
+# so that files replaced by renaming (as many editors do) are detected as well.
+#
+class InotifyMonitor:
+    def __init__(self, filenames, settleTime=0.1):
+        self.settleTime = settleTime
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1() failed")
+
+        # Watch descriptor -> directory, (directory, name) -> file
+        self.directories = {}
+        self.files = {}
+        for filename in filenames:
+            directory, name = os.path.split(os.path.abspath(filename))
+            self.files[(directory, name)] = filename
+            if directory in self.directories.values():
+                continue
+            wd = self.libc.inotify_add_watch(self.fd, directory.encode(), IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch() failed for " + directory)
+            self.directories[wd] = directory
+
+    #
+    # Return the set of watched files mentioned in the pending events
+    #
+    def readEvents(self):
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset + inotifyEventHeader.size <= len(data):
+                wd, mask, cookie, length = inotifyEventHeader.unpack_from(data, offset)
+                offset += inotifyEventHeader.size
+                name = data[offset:offset+length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+                key = (self.directories.get(wd), name)
+                if key in self.files:
+                    changed.add(self.files[key])
+
+    #
+    # Block until at least one file changed
+    # and return the set of changed files
+    #
+    def wait(self):
+        while True:
+            select.select([self.fd], [], [])
+            changed = self.readEvents()
+            if len(changed) == 0:
+                continue
+            # Let the writer finish, then collect the remaining events
+            time.sleep(self.settleTime)
+            return changed | self.readEvents()
+
+    def close(self):
+        os.close(self.fd)
+
+
+#
+# Use inotify if available, else fall back to polling
+#
+def createMonitor(filenames, interval=1.0):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyMonitor(filenames)
+        except (OSError, AttributeError):
+            print("Warning: inotify is not available. Polling for changes instead.")
+    return PollingMonitor(filenames, interval)
+
+
+#
+# Keeps the parsed inputs and converters of all jobs resident
+# and regenerates the affected outputs on changes
+#
+# Parsed netlists and MCU descriptions are taken
+# from the cache in cacheDirectory, if given.
+#
+class Watcher:
+    def __init__(self, jobs, cacheDirectory=None):
+        self.jobs = []
+        for job in jobs:
+            if job["error"] is None:
+                self.jobs += [job]
+            else:
+                print("[FAILED]  {:s}: {:s}".format(job["name"], job["error"]))
+        self.cacheDirectory = cacheDirectory
+        # (kind, filename) -> parsed IOC or CubeXML
+        self.shared = {}
+        # Job name -> Converter
+        self.converters = {}
+        for job in self.jobs:
+            for kind in ["ioc", "mcuxml"]:
+                if not (job[kind] is None):
+                    self.loadShared(kind, job[kind])
+            self.loadJob(job)
+
+    #
+    # Return all input files of all jobs
+    #
+    def getInputFiles(self):
+        filenames = set()
+        for job in self.jobs:
+            for column in ["netlist", "ioc", "mcuxml"]:
+                if not (job[column] is None):
+                    filenames.add(job[column])
+        return filenames
+
+    #
+    # Parse a shared file; if that fails, the previously parsed
+    # content (if any) is kept. Returns True on success.
+    #
+    def loadShared(self, kind, filename):
+        try:
+            self.shared[(kind, filename)] = parseSharedFile(kind, filename, self.cacheDirectory)
+        except Exception as e:
+            print("Error: {:s}".format(str(e)))
+            self.shared.setdefault((kind, filename), None)
+            return False
+        return True
+
+    def loadNetlist(self, filename):
+        if self.cacheDirectory is None:
+            return loadNetlist(filename)
+        return Cache(self.cacheDirectory).loadNetlist(filename)
+
+    def getShared(self, kind, filename):
+        if filename is None:
+            return None
+        return self.shared.get((kind, filename))
+
+    #
+    # Run the full conversion of a job and save the result
+    #
+    def loadJob(self, job):
+        start = time.perf_counter()
+        for kind in ["ioc", "mcuxml"]:
+            if not (job[kind] is None) and (self.getShared(kind, job[kind]) is None):
+                # Never convert without the configured IOC or MCU description
+                print("[FAILED]  {:s}: Unable to parse {:s}".format(job["name"], job[kind]))
+                self.converters.pop(job["name"], None)
+                return
+        try:
+            netlist = self.loadNetlist(job["netlist"])
+            converter = Converter(netlist, job["fpga"], mcu=job["mcu"], ioc=self.getShared("ioc", job["ioc"]), mcuXml=self.getShared("mcuxml", job["mcuxml"]))
+            converter.convert()
+        except Exception as e:
+            print("[FAILED]  {:s}: {:s}".format(job["name"], str(e)))
+            self.converters.pop(job["name"], None)
+            return
+        self.converters[job["name"]] = converter
+        self.save(job, start)
+
+    #
+    # Apply a new netlist revision incrementally and save the result
+    #
+    def updateJob(self, job):
+        converter = self.converters.get(job["name"])
+        if converter is None:
+            self.loadJob(job)
+            return
+        start = time.perf_counter()
+        try:
+            converter.update(self.loadNetlist(job["netlist"]))
+        except Exception as e:
+            print("[FAILED]  {:s}: {:s}".format(job["name"], str(e)))
+            return
+        self.save(job, start)
+
+    def save(self, job, start):
+        pcf = self.converters[job["name"]].pcf
+        try:
+            pcf.saveToFile(job["output"])
+        except Exception as e:
+            print("[FAILED]  {:s}: {:s}".format(job["name"], str(e)))
+            return
+        print("[UPDATED] {:s}: {:d} constraint(s) in {:.3f} s".format(job["name"], len(pcf.getConstraints()), time.perf_counter() - start))
+
+    #
+    # Reparse the changed files and regenerate the affected outputs only
+    #
+    def handleChanges(self, changed):
+        reloaded = set()
+        for kind in ["ioc", "mcuxml"]:
+            for key in list(self.shared.keys()):
+                if (key[0] == kind) and (key[1] in changed):
+                    if self.loadShared(kind, key[1]):
+                        reloaded.add(key[1])
+
+        for job in self.jobs:
+            if (job["ioc"] in reloaded) or (job["mcuxml"] in reloaded):
+                # The signal names may have changed everywhere
+                self.loadJob(job)
+            elif job["netlist"] in changed:
+                self.updateJob(job)
+
+    #
+    # Wait for changes until interrupted
+    #
+    def run(self, interval=1.0):
+        monitor = createMonitor(self.getInputFiles(), interval)
+        print("Watching {:d} file(s) for changes. Press Ctrl+C to stop.".format(len(self.getInputFiles())))
+        try:
+            while True:
+                self.handleChanges(monitor.wait())
+        except KeyboardInterrupt:
+            pass
+        monitor.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerate FPGA pin constraint files whenever their inputs change.")
+    parser.add_argument("manifest", help="CSV or JSON list of conversion jobs")
+    parser.add_argument("--interval", type=float, default=1.0, help="polling interval in seconds, if inotify is not available")
+    parser.add_argument("--cache", nargs="?", const=cache.defaultDirectory, default=None, metavar="DIRECTORY", help="cache parsed netlists and MCU descriptions (default directory: %(const)s)")
+    args = parser.parse_args()
+
+    Watcher(importManifest(args.manifest), args.cache).run(args.interval)